@@ -7,8 +7,9 @@ from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
-import json
+
+from llm_backends import make_client
+from llm_json import decode_json, json_mode, parse_stats
 
 load_dotenv()
 
@@ -17,10 +18,9 @@ CORS(app)
 
 # Initialize DeepSeek client
 api_key = os.getenv('DEEPSEEK_API_KEY')
-client = OpenAI(
-    api_key=api_key,
-    base_url="https://api.deepseek.com/v1"
-)
+# The shared client (llm_backends.py) routes, rate-limits and retries. Its disk cache only
+# covers these temperature 0.8 sample generations with LLM_CACHE_SAMPLED=true
+client = make_client(api_key)
 
 # Sample articles for testing
 test_articles = [
@@ -59,24 +59,17 @@ Make it punchy, make it interesting, make people want to read it. Think r/todayi
 
     try:
         response = client.chat.completions.create(
-            model="deepseek-chat",
+            task='post',
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=0.8,
-            max_tokens=1500
+            max_tokens=1500,
+            **json_mode()
         )
         
-        response_text = response.choices[0].message.content.strip()
-        
-        # Parse JSON
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        post_data = json.loads(response_text)
+        post_data = decode_json(response.choices[0].message.content, required=('title', 'content'))
         post_data['source_title'] = article['title']
         post_data['image'] = None  # Would be populated from actual article images
         
@@ -102,7 +95,10 @@ def generate_posts():
     return jsonify({
         'success': True,
         'posts': posts,
-        'count': len(posts)
+        'count': len(posts),
+        'cache': client.cache.stats() if client.cache else None,
+        'backends': client.stats(),
+        'json': parse_stats()
     })
 
 @app.route('/')
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Offline batch generation for large backfills.
+
+Instead of the live loop's interactive requests, a batch job renders every
+request up front into JSONL files in the OpenAI Batch API input format, runs
+them, and streams the results back into `posts` and `comments` with bulk
+writes:
+
+    1. claim `count` articles under a long lease; write articles.jsonl and
+       posts.requests.jsonl
+    2. run the post requests              -> posts.results.jsonl
+    3. load posts passing min_quality_score in bulk, release the rest
+    4. write one batched comment request per saved post -> comments.requests.jsonl
+    5. run them                           -> comments.results.jsonl
+    6. load the comments in bulk
+
+Requests run either on the local executor (the routed client, concurrently,
+appending each result as it arrives) or on an OpenAI-compatible batch
+endpoint (upload, poll, download). Every stage is resumable, keyed by request
+custom_id: rerunning the same command skips requests that already have a
+result, posts already saved for an article and posts that already have
+comments. Requests that failed are retried on the next run; articles whose
+request never succeeds go back to the pool when the lease expires.
+
+Usage:
+    python3 content_generator.py batch --count 10000 --job-dir batch_jobs/backfill
+    python3 content_generator.py batch --job-dir batch_jobs/backfill --executor remote
+
+Configuration (environment), remote executor only:
+    LLM_BATCH_BASE_URL   batch endpoint (default the DeepSeek/LLM_BASE_URL endpoint)
+    LLM_BATCH_API_KEY    key (default DEEPSEEK_API_KEY)
+    LLM_BATCH_MODEL      model named in rendered requests (default the routed backend's model)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+from psycopg2.extras import execute_values
+
+from content_generator import PERSONAS, UNDO_CLAIM
+from llm_client import DEEPSEEK_BASE_URL
+from persona_comments import parse_comment_batch
+
+# Rows per bulk INSERT / UPDATE
+WRITE_CHUNK = 500
+
+# Batch endpoint statuses after which there is nothing more to wait for
+FINISHED = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def read_jsonl(path):
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def reply_text(record):
+    """Completion text of a batch output record, or None if the request failed."""
+    response = record.get('response') or {}
+    if record.get('error') or response.get('status_code') != 200:
+        return None
+    try:
+        return response['body']['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def completed(results_path):
+    """custom_id -> reply text for every request that has succeeded (latest wins)."""
+    replies = {}
+    for record in read_jsonl(results_path):
+        text = reply_text(record)
+        if text is not None:
+            replies[record['custom_id']] = text
+    return replies
+
+
+def chunks(rows, size=WRITE_CHUNK):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+class BatchJob:
+    """One resumable batch generation run, stored in `job_dir`."""
+
+    def __init__(self, generator, job_dir, executor='local', lease_hours=48, poll_seconds=60):
+        self.generator = generator
+        self.pool = generator.pool
+        self.job_dir = job_dir
+        self.executor = executor
+        self.poll_seconds = poll_seconds
+        os.makedirs(job_dir, exist_ok=True)
+
+        self.state_path = self.path('job.json')
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        else:
+            self.state = {
+                # Claims belong to the job, not the process, so another run can resume them
+                'worker_id': f"batch:{os.path.basename(os.path.abspath(job_dir))}",
+                'created': None,
+                'remote_batches': {},
+            }
+        generator.worker_id = self.state['worker_id']
+        generator.generator_config['lease_seconds'] = int(lease_hours * 3600)
+
+    def path(self, name):
+        return os.path.join(self.job_dir, name)
+
+    def save_state(self):
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def run(self, count=None):
+        # One event loop for the whole job: the async client is bound to the loop it first ran on
+        asyncio.run(self._run(count))
+
+    async def _run(self, count):
+        if not os.path.exists(self.path('articles.jsonl')):
+            if not count:
+                raise ValueError(f"{self.job_dir} has no articles yet; pass --count to start a job")
+            self.prepare_posts(count)
+        await self.execute('posts', 'post')
+        self.load_posts()
+        self.prepare_comments()
+        await self.execute('comments', 'comment')
+        self.load_comments()
+
+    def render(self, custom_id, task, request):
+        """One Batch API input line."""
+        model = os.getenv('LLM_BATCH_MODEL') or self.generator.client.model_for(task)
+        return {'custom_id': custom_id, 'method': 'POST', 'url': '/v1/chat/completions',
+                'body': dict(request, model=model)}
+
+    def prepare_posts(self, count):
+        """Claim articles and write the post requests."""
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT LOCALTIMESTAMP")
+                self.state['created'] = cursor.fetchone()[0].isoformat()
+            conn.commit()
+            articles = self.generator.claim_articles(conn, count)
+        with open(self.path('posts.requests.jsonl'), 'w', encoding='utf-8') as requests, \
+                open(self.path('articles.jsonl.tmp'), 'w', encoding='utf-8') as meta:
+            for article in articles:
+                request = self.generator.post_request(article)
+                requests.write(json.dumps(self.render(f"post-{article['id']}", 'post', request)) + '\n')
+                meta.write(json.dumps({key: article[key] for key in ('id', 'title', 'url', 'images')}) + '\n')
+        # articles.jsonl marks the prepare stage as done
+        os.replace(self.path('articles.jsonl.tmp'), self.path('articles.jsonl'))
+        self.save_state()
+        print(f"📝 Claimed {len(articles)} articles, wrote {len(articles)} post requests")
+
+    async def execute(self, stage, task):
+        """Run the stage's requests that don't have a result yet."""
+        requests_path = self.path(f"{stage}.requests.jsonl")
+        results_path = self.path(f"{stage}.results.jsonl")
+        done = completed(results_path)
+        pending = [request for request in read_jsonl(requests_path) if request['custom_id'] not in done]
+        if not pending and stage not in self.state['remote_batches']:
+            return
+
+        print(f"🚀 Running {len(pending)} {stage} requests ({self.executor})...")
+        if self.executor == 'remote':
+            self.execute_remote(stage, pending, results_path)
+        else:
+            await self.execute_local(task, pending, results_path)
+        print(f"✅ {len(completed(results_path))} {stage} requests have results")
+
+    async def execute_local(self, task, pending, results_path):
+        """Send requests through the routed client, appending each result as it completes."""
+        slots = asyncio.Semaphore(self.generator.generator_config['llm_concurrency'])
+        with open(results_path, 'a', encoding='utf-8') as results:
+            async def run(request):
+                async with slots:
+                    try:
+                        response = await self.generator.client.chat.completions.create(task=task, **request['body'])
+                        record = {'custom_id': request['custom_id'], 'error': None, 'response': {
+                            'status_code': 200,
+                            'body': {'choices': [{'message': {'content': response.choices[0].message.content}}]}
+                        }}
+                    except Exception as e:
+                        logging.error(f"Batch request {request['custom_id']} failed: {e}")
+                        record = {'custom_id': request['custom_id'], 'response': None,
+                                  'error': {'message': str(e)}}
+                results.write(json.dumps(record) + '\n')
+                results.flush()
+
+            await asyncio.gather(*(run(request) for request in pending))
+
+    def execute_remote(self, stage, pending, results_path):
+        """Submit to an OpenAI-compatible batch endpoint, wait for it and download the output."""
+        from openai import OpenAI
+
+        client = OpenAI(api_key=os.getenv('LLM_BATCH_API_KEY', os.getenv('DEEPSEEK_API_KEY')),
+                        base_url=os.getenv('LLM_BATCH_BASE_URL', os.getenv('LLM_BASE_URL', DEEPSEEK_BASE_URL)))
+
+        # A batch submitted by an interrupted run is picked up again rather than resubmitted
+        batch_id = self.state['remote_batches'].get(stage)
+        if not batch_id:
+            input_path = self.path(f"{stage}.pending.jsonl")
+            with open(input_path, 'w', encoding='utf-8') as f:
+                for request in pending:
+                    f.write(json.dumps(request) + '\n')
+            with open(input_path, 'rb') as f:
+                upload = client.files.create(file=f, purpose='batch')
+            batch_id = client.batches.create(input_file_id=upload.id, endpoint='/v1/chat/completions',
+                                             completion_window='24h').id
+            self.state['remote_batches'][stage] = batch_id
+            self.save_state()
+
+        while True:
+            batch = client.batches.retrieve(batch_id)
+            if batch.status in FINISHED:
+                break
+            counts = batch.request_counts
+            print(f"⏳ Batch {batch_id} {batch.status}"
+                  + (f": {counts.completed}/{counts.total}" if counts else ''))
+            time.sleep(self.poll_seconds)
+
+        with open(results_path, 'a', encoding='utf-8') as results:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    text = client.files.content(file_id).text
+                    results.write(text if text.endswith('\n') else text + '\n')
+        if batch.status != 'completed':
+            print(f"⚠️  Batch {batch_id} ended {batch.status}")
+        del self.state['remote_batches'][stage]
+        self.save_state()
+
+    def saved_posts(self):
+        """(post id, article id, title, content) of posts this job has saved."""
+        article_ids = [article['id'] for article in read_jsonl(self.path('articles.jsonl'))]
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, source_article_id, title, content FROM posts
+                    WHERE source_article_id = ANY(%s) AND created_at >= %s
+                """, (article_ids, self.state['created']))
+                rows = cursor.fetchall()
+            conn.commit()
+        return rows
+
+    def load_posts(self):
+        """Bulk-insert the posts that passed, then release the articles that didn't."""
+        articles = {article['id']: article for article in read_jsonl(self.path('articles.jsonl'))}
+        saved = {row[1] for row in self.saved_posts()}
+        worker_id = self.state['worker_id']
+
+        posts, rejected = [], []
+        for custom_id, text in completed(self.path('posts.results.jsonl')).items():
+            article_id = int(custom_id.split('-', 1)[1])
+            if article_id in saved or article_id not in articles:
+                continue
+            try:
+                post = self.generator.post_from_reply(text, articles[article_id])
+            except ValueError:
+                rejected.append(article_id)
+                continue
+            if self.generator.good_enough(post):
+                posts.append(post)
+            else:
+                rejected.append(article_id)
+        posts, duplicates = self.distinct_posts(posts)
+
+        saved_count = 0
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for chunk in chunks(posts):
+                    # Only articles the job still holds get a post; after a lease
+                    # expired, another worker may have claimed and posted the article
+                    saved_ids = execute_values(cursor, """
+                        WITH v (title, content, category, tags, images, quality_score,
+                                source_article_id, wiki_url, tldr, claimed_by) AS (VALUES %s),
+                        lease AS (
+                            UPDATE wiki_articles w SET claimed_by = NULL, claimed_until = NULL
+                            FROM v WHERE w.id = v.source_article_id AND w.claimed_by = v.claimed_by
+                            RETURNING w.id
+                        )
+                        INSERT INTO posts (title, content, category, tags, images, quality_score,
+                                           source_article_id, wiki_url, tldr, created_at)
+                        SELECT v.title, v.content, v.category, v.tags, v.images, v.quality_score,
+                               v.source_article_id, v.wiki_url, v.tldr, NOW()
+                        FROM v JOIN lease ON lease.id = v.source_article_id
+                        RETURNING id, source_article_id
+                    """, [(post['title'], post['content'], post['category'], post.get('tags', []),
+                           post.get('images', []), post['quality_score'], post['source_article_id'],
+                           post['wiki_url'], post['tldr'], worker_id) for post in chunk],
+                        template='(%s, %s, %s, %s::text[], %s::text[], %s::float, %s::int, %s, %s, %s)',
+                        page_size=len(chunk), fetch=True)
+                    conn.commit()
+                    saved_count += len(saved_ids)
+                    self.index_saved(chunk, saved_ids)
+
+                if duplicates:
+                    # Near-duplicates aren't retried; the articles keep counting as used
+                    cursor.execute("""
+                        UPDATE wiki_articles SET claimed_by = NULL, claimed_until = NULL
+                        WHERE id = ANY(%s) AND claimed_by = %s
+                    """, (duplicates, worker_id))
+                    conn.commit()
+                if rejected:
+                    cursor.execute(f"""
+                        UPDATE wiki_articles SET {UNDO_CLAIM}
+                        WHERE id = ANY(%s) AND claimed_by = %s
+                    """, (rejected, worker_id))
+                    conn.commit()
+            finally:
+                cursor.close()
+        lost = len(posts) - saved_count
+        print(f"💾 Saved {saved_count} posts, released {len(rejected)} rejected articles"
+              + (f", dropped {len(duplicates)} near-duplicates" if duplicates else "")
+              + (f", skipped {lost} whose lease had passed to another worker" if lost else ""))
+
+    def distinct_posts(self, posts):
+        """
+        Drop posts that near-duplicate a recent post or an earlier post of this
+        load; returns `(posts, duplicate article ids)`. Unlike the live path,
+        a near-duplicate isn't re-requested.
+        """
+        index = self.generator.near_duplicates
+        if index is None:
+            return posts, []
+        # Posts other workers saved since the index was built
+        self.generator.index_posts(self.pool.run(self.generator.recent_posts))
+        distinct, duplicates = [], []
+        for post in posts:
+            signature = index.signature(post)
+            match = index.query(signature)
+            if match is None:
+                # Held under the article until the insert gives it a post id
+                index.add(f"article:{post['source_article_id']}", signature, post['title'])
+                distinct.append(post)
+            else:
+                key, score, view = match
+                logging.info(f"Near-duplicate post ({view} similarity {score:.2f} "
+                             f"to \"{index.titles[key]}\"): {post['title']}")
+                duplicates.append(post['source_article_id'])
+        return distinct, duplicates
+
+    def index_saved(self, posts, saved_ids):
+        """Re-key the index entries `distinct_posts` added to the saved post ids."""
+        index = self.generator.near_duplicates
+        if index is None:
+            return
+        post_ids = {article_id: post_id for post_id, article_id in saved_ids}
+        for post in posts:
+            key = f"article:{post['source_article_id']}"
+            signature = index.signatures.get(key)
+            index.remove(key)
+            if post['source_article_id'] in post_ids and signature is not None:
+                index.add(post_ids[post['source_article_id']], signature, post['title'])
+
+    def prepare_comments(self):
+        """Append a batched comment request for every saved post that doesn't have one."""
+        requests_path = self.path('comments.requests.jsonl')
+        written = {request['custom_id'] for request in read_jsonl(requests_path)}
+        added = 0
+        with open(requests_path, 'a', encoding='utf-8') as requests:
+            for post_id, _, title, content in self.saved_posts():
+                custom_id = f"comments-{post_id}"
+                if custom_id in written:
+                    continue
+                personas = random.sample(PERSONAS, min(random.randint(3, 12), len(PERSONAS)))
+                request = self.generator.comment_batch_request({'title': title, 'content': content}, personas)
+                requests.write(json.dumps(self.render(custom_id, 'comment', request)) + '\n')
+                added += 1
+        if added:
+            print(f"📝 Wrote {added} comment requests")
+
+    def load_comments(self):
+        """Bulk-insert comments for posts that don't have AI comments yet."""
+        replies = completed(self.path('comments.results.jsonl'))
+        post_ids = [int(custom_id.split('-', 1)[1]) for custom_id in replies]
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT DISTINCT post_id FROM comments WHERE post_id = ANY(%s) AND is_ai",
+                               (post_ids,))
+                commented = {row[0] for row in cursor.fetchall()}
+
+                # The roster is in the prompt; any known persona is accepted back
+                rows = []
+                for custom_id, text in replies.items():
+                    post_id = int(custom_id.split('-', 1)[1])
+                    if post_id not in commented:
+                        rows.extend((post_id, name, comment)
+                                    for name, comment in parse_comment_batch(text, PERSONAS).items())
+
+                # One commit, so a rerun never finds a post with only part of its comments
+                for chunk in chunks(rows):
+                    execute_values(cursor, """
+                        INSERT INTO comments (post_id, username, content, is_ai, created_at) VALUES %s
+                    """, chunk, template='(%s, %s, %s, true, NOW())')
+                conn.commit()
+            finally:
+                cursor.close()
+        print(f"💬 Saved {len(rows)} comments")
+
+
+def add_arguments(parser):
+    parser.add_argument('--job-dir', required=True, help='Directory holding the job files (reuse it to resume)')
+    parser.add_argument('--count', type=int, help='Articles to claim when starting a new job')
+    parser.add_argument('--executor', choices=['local', 'remote'], default='local',
+                        help='Run requests through the local client or a batch endpoint')
+    parser.add_argument('--lease-hours', type=float, default=48, help='How long claimed articles stay reserved')
+    parser.add_argument('--poll-seconds', type=float, default=60, help='Batch endpoint polling interval')
+
+
+def run_batch_job(generator, args):
+    job = BatchJob(generator, args.job_dir, executor=args.executor,
+                   lease_hours=args.lease_hours, poll_seconds=args.poll_seconds)
+    try:
+        job.run(args.count)
+    except ValueError as e:
+        print(f"❌ {e}")
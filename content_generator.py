@@ -4,19 +4,36 @@ Wikifeedia AI Content Generator
 
 This service runs 24/7, using DeepSeek API to mine Wikipedia and generate
 engaging social media posts with AI-generated comments.
+
+Any number of generator processes, on one host or many, can run against the
+same database: articles are claimed with leases, so workers never pick the
+same article and a crashed worker's articles return to the pool.
+
+Generation is demand-driven: each batch is sized to keep the number of
+unread posts near TARGET_POST_BUFFER, and a generator with a full buffer
+sleeps until readers start consuming it.
 """
 
+import argparse
+import asyncio
+import math
+import multiprocessing
 import os
-from openai import OpenAI
+import socket
+from concurrent.futures import ThreadPoolExecutor
 import random
 import psycopg2
 from datetime import datetime
-import json
 import logging
-import time
 import sys
 from dotenv import load_dotenv
 
+from db_pool import ConnectionPool
+from llm_backends import make_client
+from llm_json import decode_json, json_mode, parse_stats
+from near_duplicates import NearDuplicateIndex
+from persona_comments import batch_comment_messages, batch_max_tokens, parse_comment_batch
+
 # Load environment variables
 load_dotenv()
 
@@ -28,8 +45,103 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+# Article selection strategies: SQL filter and the generator_config values it
+# takes. Each filter matches a partial index on random_key (database/migrations/002).
+SELECTION_STRATEGIES = {
+    'fresh': ("last_processed IS NULL AND quality_score >= %s", ('min_article_score',)),
+    'quality': ("quality_score > 7.0 AND times_used < 3", ()),
+    'underused': ("times_used < 2 AND quality_score > 5.0", ()),
+}
+
+# Only what create_engaging_post uses; the prompt reads the first 3000 characters
+ARTICLE_COLUMNS = "id, title, url, images, LEFT(content, 3000) AS content"
+
+# Keys save_post needs from the model's post JSON
+POST_FIELDS = ('title', 'content', 'category', 'quality_score', 'tldr')
+
+# AI commenter personas
+PERSONAS = [
+    {"name": "HistoryBuff1987", "style": "enthusiastic historian, loves to add context"},
+    {"name": "ScienceNerd_", "style": "skeptical scientist, asks good questions"},
+    {"name": "CasualLurker", "style": "casual reader, reacts with 'wow' and simple thoughts"},
+    {"name": "DevilsAdvocate99", "style": "contrarian who politely challenges assumptions"},
+    {"name": "FunFactBot", "style": "adds related fun facts and connections"},
+    {"name": "SourceChecker", "style": "asks for sources and verification"},
+    {"name": "ELI5_Please", "style": "asks for simpler explanations"},
+    {"name": "PunMaster3000", "style": "makes dad jokes and puns about the topic"},
+]
+
+# Undo a claim that never produced a post (right-hand sides see the pre-update row)
+UNDO_CLAIM = """
+    claimed_by = NULL, claimed_until = NULL,
+    times_used = GREATEST(times_used - 1, 0),
+    last_processed = CASE WHEN times_used <= 1 THEN NULL ELSE last_processed END
+"""
+
+# NOTIFY channel fired when a reader opens an unread post (database/migrations/004)
+CONSUMED_CHANNEL = 'posts_consumed'
+
+
+class BufferScheduler:
+    """
+    Size generation batches to keep the unread-post buffer at a target depth.
+
+    Each observation of the buffer gives its depth and the posts created
+    since the previous one, from which the consumption rate follows. A batch
+    covers the shortfall plus what readers are expected to consume before
+    the next observation, divided by the share of claimed articles that
+    recently passed min_quality_score, and split between the workers.
+    """
+
+    def __init__(self, target, max_batch, workers=1, smoothing=0.3, min_acceptance=0.2):
+        self.target = target
+        self.max_batch = max_batch
+        self.workers = max(workers, 1)
+        self.smoothing = smoothing
+        self.min_acceptance = min_acceptance
+        self.acceptance = 1.0   # share of claimed articles that became posts
+        self.consumption = 0.0  # unread posts opened per second
+        self.cycle = 0.0        # seconds between observations
+        self.depth = None
+        self.since = None       # database time of the last observation
+
+    def _smooth(self, average, sample):
+        return average + self.smoothing * (sample - average)
+
+    def observe(self, depth, produced, now):
+        """Record the buffer depth and posts created since the last observation."""
+        if self.depth is not None:
+            elapsed = (now - self.since).total_seconds()
+            if elapsed > 0:
+                rate = max(self.depth + produced - depth, 0) / elapsed
+                if self.cycle:
+                    self.consumption = self._smooth(self.consumption, rate)
+                    self.cycle = self._smooth(self.cycle, elapsed)
+                else:
+                    self.consumption, self.cycle = rate, elapsed
+        self.depth = depth
+        self.since = now
+
+    def record_batch(self, claimed, generated):
+        """Update the acceptance rate from a finished batch."""
+        if claimed:
+            self.acceptance = max(self._smooth(self.acceptance, generated / claimed), self.min_acceptance)
+
+    def refill_at(self):
+        """Posts readers should consume before an idle generator wakes up."""
+        return max(1, self.target // 10)
+
+    def batch_size(self):
+        """Articles to claim now; 0 when the buffer is full."""
+        wanted = self.target - self.depth + self.consumption * self.cycle
+        if wanted <= 0:
+            return 0
+        per_worker = wanted / self.workers / self.acceptance
+        return min(self.max_batch, max(1, math.ceil(per_worker)))
+
+
 class WikiPostGenerator:
-    def __init__(self):
+    def __init__(self, workers=1):
         """Initialize the generator with environment variables."""
         
         # Get API key from environment
@@ -38,12 +150,11 @@ class WikiPostGenerator:
             logging.error("DEEPSEEK_API_KEY not found in environment variables")
             sys.exit(1)
         
-        # Initialize OpenAI client (DeepSeek uses OpenAI-compatible API)
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.deepseek.com/v1"
-        )
-        self.model = "deepseek-chat"
+        # The shared client routes posts and comments to their backends (DeepSeek,
+        # local Ollama) and rate-limits, retries and caches. Workers on this host
+        # split the rate budgets and backend concurrency limits.
+        self.client = make_client(api_key, async_client=True, share=workers)
+        self.workers = workers
         
         # Database configuration from environment
         self.db_config = {
@@ -57,86 +168,475 @@ class WikiPostGenerator:
         # Generator configuration
         self.generator_config = {
             'batch_size': int(os.getenv('BATCH_SIZE', 5)),
+            # Unread posts to keep in stock; 0 restores fixed BATCH_SIZE batches
+            'target_post_buffer': int(os.getenv('TARGET_POST_BUFFER', 500)),
+            # Upper bound on a buffer-sized batch
+            'max_batch_size': int(os.getenv('MAX_BATCH_SIZE', 50)),
             'batch_delay_seconds': int(os.getenv('BATCH_DELAY_SECONDS', 600)),
-            'min_quality_score': float(os.getenv('MIN_QUALITY_SCORE', 6.0))
+            'min_quality_score': float(os.getenv('MIN_QUALITY_SCORE', 6.0)),
+            # Offline score (scripts/score_articles.py) an article needs before we spend an LLM call on it
+            'min_article_score': float(os.getenv('MIN_ARTICLE_SCORE', 4.0)),
+            # How long a claimed article stays reserved for this worker
+            'lease_seconds': int(os.getenv('ARTICLE_LEASE_SECONDS', 900)),
+            # LLM requests in flight at once across all articles in a batch
+            'llm_concurrency': int(os.getenv('LLM_CONCURRENCY', 8)),
+            # Ask for all of a post's persona comments in one request
+            'batch_comments': os.getenv('BATCH_COMMENTS', 'true').lower() in ('1', 'true', 'yes'),
+            # Similarity (0-1) at which a post is a near-duplicate of a recent one; 0 turns the check off
+            'near_duplicate_threshold': float(os.getenv('NEAR_DUPLICATE_THRESHOLD', 0.5)),
+            # Recent posts kept in the near-duplicate index
+            'near_duplicate_window': int(os.getenv('NEAR_DUPLICATE_WINDOW', 10000)),
+            # New angles to ask for before giving up on a near-duplicate article
+            'near_duplicate_retries': int(os.getenv('NEAR_DUPLICATE_RETRIES', 1))
         }
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.llm_slots = None  # asyncio.Semaphore, created on the running loop
+        self.last_claimed = 0  # articles claimed by the last batch
+        self.listen_conn = None  # autocommit connection LISTENing on CONSUMED_CHANNEL
+        self.near_duplicates = None  # NearDuplicateIndex of recent posts, if enabled
+        self.indexed_through = 0  # highest post id in near_duplicates
+        
+        # psycopg2 blocks, so queries run on a thread pool, each call on its own
+        # pooled connection; lost connections are replaced and the call retried
+        pool_size = int(os.getenv('DB_POOL_SIZE', 4))
+        self.pool = ConnectionPool(self.connect, size=pool_size)
+        self.db_executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='db')
+        self.register_statements()
         
         try:
-            self.db_conn = psycopg2.connect(
-                host=self.db_config['host'],
-                port=self.db_config['port'],
-                database=self.db_config['name'],
-                user=self.db_config['user'],
-                password=self.db_config['password']
-            )
+            self.pool.run(lambda conn: None)  # waits out a database that is still starting
             logging.info("Connected to database")
         except Exception as e:
             logging.error(f"Database connection failed: {e}")
             sys.exit(1)
         
-    def generate_post_batch(self):
-        """Generate a batch of posts."""
-        batch_size = self.generator_config['batch_size']
-        logging.info(f"Generating batch of {batch_size} posts using DeepSeek API...")
+        if self.generator_config['near_duplicate_threshold'] > 0:
+            self.near_duplicates = NearDuplicateIndex(self.generator_config['near_duplicate_threshold'],
+                                                      self.generator_config['near_duplicate_window'])
+            self.index_posts(self.pool.run(self.recent_posts))
+            logging.info(f"Near-duplicate index holds {len(self.near_duplicates)} recent posts")
+    
+    def connect(self):
+        """Open a new connection to the configured database."""
+        return psycopg2.connect(
+            host=self.db_config['host'],
+            port=self.db_config['port'],
+            database=self.db_config['name'],
+            user=self.db_config['user'],
+            password=self.db_config['password'],
+            connect_timeout=10,
+            # Notice dead TCP sessions instead of hanging on them
+            keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3,
+            options=f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))}"
+        )
+    
+    def register_statements(self):
+        """Hot queries, prepared once per pooled connection."""
+        for strategy, (where, _) in SELECTION_STRATEGIES.items():
+            # Above the random start point, then wrap around below it
+            for side, bound in (('above', 'random_key >= %s'), ('below', 'random_key < %s')):
+                self.pool.register(f"claim_{strategy}_{side}", f"""
+                    WITH candidates AS (
+                        SELECT id AS claim_id FROM wiki_articles
+                        WHERE {where} AND {bound} AND claimed_until IS NULL
+                        ORDER BY random_key LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE wiki_articles w
+                    SET claimed_by = %s,
+                        claimed_until = NOW() + make_interval(secs => %s),
+                        last_processed = NOW(),
+                        times_used = times_used + 1,
+                        random_key = random()
+                    FROM candidates c
+                    WHERE w.id = c.claim_id
+                    RETURNING {ARTICLE_COLUMNS}
+                """)
+        # Post, end of the article's lease and every comment in one statement.
+        # The claim already counted this use, so only the lease ends. The post
+        # is only written while this worker still holds the lease, so when the
+        # pool retries after a commit whose reply was lost, the retry writes
+        # nothing and returns the post the first attempt saved.
+        self.pool.register('save_post', """
+            WITH lease AS (
+                UPDATE wiki_articles
+                SET claimed_by = NULL, claimed_until = NULL
+                WHERE id = %s AND claimed_by = %s
+                RETURNING id
+            ), post AS (
+                INSERT INTO posts (title, content, category, tags, images, quality_score,
+                                   source_article_id, wiki_url, tldr, created_at)
+                SELECT %s, %s, %s, %s::text[], %s::text[], %s::float, %s, %s, %s, NOW() FROM lease
+                RETURNING id
+            ), new_comments AS (
+                INSERT INTO comments (post_id, username, content, is_ai, created_at)
+                SELECT post.id, c.username, c.content, true, NOW()
+                FROM post, unnest(%s::text[], %s::text[]) AS c(username, content)
+            )
+            SELECT id FROM post
+            UNION ALL
+            SELECT p.id FROM posts p JOIN wiki_articles w ON w.id = p.source_article_id
+            WHERE p.source_article_id = %s AND w.claimed_by IS NULL
+              AND p.created_at >= w.last_processed AND NOT EXISTS (SELECT 1 FROM lease)
+        """)
+        self.pool.register('end_lease', """
+            UPDATE wiki_articles SET claimed_by = NULL, claimed_until = NULL
+            WHERE id = %s AND claimed_by = %s
+        """)
+        self.pool.register('release_article', f"""
+            UPDATE wiki_articles SET {UNDO_CLAIM}
+            WHERE id = %s AND claimed_by = %s
+        """)
+    
+    def query_failed(self, conn, what, error):
+        """Log a failed query and roll back; a lost connection is re-raised so the pool reconnects."""
+        if conn.closed:
+            raise error
+        logging.error(f"Error {what}: {error}")
+        conn.rollback()
+    
+    async def db(self, method, *args):
+        """Run `method(conn, *args)` on a pooled connection without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db_executor, self.pool.run, method, *args)
+    
+    async def complete(self, task, **kwargs):
+        """One chat completion for `task`, waiting for a free slot under the concurrency limit."""
+        if self.llm_slots is None:
+            self.llm_slots = asyncio.Semaphore(self.generator_config['llm_concurrency'])
+        async with self.llm_slots:
+            response = await self.client.chat.completions.create(task=task, **kwargs)
+        return response.choices[0].message.content.strip()
+    
+    async def generate_post_batch(self, batch_size=None):
+        """
+        Generate a batch of posts (BATCH_SIZE unless `batch_size` is given).
+
+        Every claimed article runs its own chain (post, then its comments)
+        concurrently with the others, so a batch takes about as long as its
+        slowest chain rather than the sum of every request.
+        """
+        batch_size = batch_size or self.generator_config['batch_size']
+        logging.info(f"Generating batch of {batch_size} posts...")
         
-        generated = 0
-        for _ in range(batch_size):
-            try:
-                article = self.select_interesting_article()
-                if article:
-                    logging.info(f"Creating post for article: {article['title']}")
-                    post = self.create_engaging_post(article)
-                    if post and post.get('quality_score', 0) > self.generator_config['min_quality_score']:
-                        post_id = self.save_post(post)
-                        logging.info(f"Saved post with ID: {post_id}")
-                        self.generate_ai_comments(post_id, num_comments=random.randint(3, 12))
-                        generated += 1
-                    else:
-                        logging.info(f"Post quality score too low: {post.get('quality_score', 0) if post else 'None'}")
-            except Exception as e:
-                logging.error(f"Error generating post: {e}")
+        # Don't claim articles we can't process while the API is failing
+        retry_in = self.client.retry_in()
+        if retry_in:
+            logging.warning(f"LLM circuit breakers open, waiting {retry_in:.0f}s before claiming articles")
+            await asyncio.sleep(retry_in)
+        
+        await self.db(self.reclaim_expired_leases)
+        if self.near_duplicates is not None:
+            # Posts other workers saved since the last batch
+            self.index_posts(await self.db(self.recent_posts))
+        articles = await self.db(self.claim_articles, batch_size)
+        self.last_claimed = len(articles)
+        results = await asyncio.gather(*(self.process_article(article) for article in articles))
+        generated = sum(results)
         
         logging.info(f"Generated {generated} posts in this batch")
+        if self.client.cache:
+            logging.info(f"LLM cache: {self.client.cache.stats()}")
+        logging.info(f"LLM backends: {self.client.stats()}")
+        logging.info(f"LLM JSON replies: {parse_stats()}")
         return generated
     
-    def select_interesting_article(self):
-        """Smart article selection strategy."""
-        cursor = self.db_conn.cursor()
+    async def process_article(self, article):
+        """Turn one claimed article into a post with comments; returns 1 if a post was saved."""
+        post_id = None
+        signature = None
+        near_duplicate = False
+        placeholder = f"article:{article['id']}"
+        try:
+            logging.info(f"Creating post for article: {article['title']}")
+            post = await self.create_engaging_post(article)
+            if self.good_enough(post):
+                # Catch near-duplicates before any comment request is spent on them
+                post, signature = await self.distinct_post(article, post)
+                near_duplicate = post is None
+            if self.good_enough(post):
+                if signature is not None:
+                    # Hold the post's place so articles still in flight can't publish the same thing
+                    self.near_duplicates.add(placeholder, signature, post['title'])
+                # Comments are written with the post, so it never appears without them
+                comments = await self.generate_ai_comments(post, num_comments=random.randint(3, 12))
+                post_id = await self.db(self.save_post, post, comments)
+                logging.info(f"Saved post with ID: {post_id} ({len(comments)} comments)")
+                if post_id and signature is not None:
+                    self.near_duplicates.add(post_id, signature, post['title'])
+            elif not near_duplicate:
+                logging.info(f"Post quality score too low: {post.get('quality_score', 0) if post else 'None'}")
+        except Exception as e:
+            logging.error(f"Error generating post: {e}")
+        finally:
+            if self.near_duplicates is not None:
+                self.near_duplicates.remove(placeholder)
+            if near_duplicate:
+                # The article keeps counting as used, so it isn't claimed straight back
+                await self.db(self.end_lease, article['id'])
+            elif not post_id:
+                await self.db(self.release_article, article['id'])
+        return 1 if post_id else 0
+    
+    def good_enough(self, post):
+        return bool(post) and post.get('quality_score', 0) > self.generator_config['min_quality_score']
+    
+    async def distinct_post(self, article, post):
+        """
+        Check `post` against the near-duplicate index. A near-duplicate is
+        re-requested with the matching posts' titles as angles to avoid, up
+        to NEAR_DUPLICATE_RETRIES times. Returns `(post, signature)`, or
+        `(None, None)` if no distinct post of good enough quality came back.
+        """
+        if self.near_duplicates is None:
+            return post, None
+        avoid = []
+        for attempt in range(self.generator_config['near_duplicate_retries'] + 1):
+            signature = self.near_duplicates.signature(post)
+            match = self.near_duplicates.query(signature)
+            if match is None:
+                return post, signature
+            key, score, view = match
+            avoid.append(self.near_duplicates.titles[key])
+            logging.info(f"Near-duplicate post for {article['title']} ({view} similarity {score:.2f} "
+                         f"to \"{avoid[-1]}\"): {post['title']}")
+            if attempt == self.generator_config['near_duplicate_retries']:
+                break
+            post = await self.create_engaging_post(article, avoid)
+            if not self.good_enough(post):
+                break
+        return None, None
+    
+    def claim_articles(self, conn, count):
+        """
+        Claim `count` candidate articles for this worker, one round trip per strategy.
+
+        Each slot draws a strategy at random as before. Articles are read from
+        the strategy's partial index starting at a random point on random_key,
+        wrapping around to the start, so the cost doesn't grow with the table.
+        """
+        strategies = [random.choice(list(SELECTION_STRATEGIES)) for _ in range(count)]
+        articles = []
+        seen = set()
         
-        strategy = random.choice(['fresh', 'quality', 'underused'])
+        for strategy in dict.fromkeys(strategies):
+            wanted = strategies.count(strategy)
+            for row in self._claim_strategy(conn, strategy, wanted):
+                if row['id'] not in seen:
+                    seen.add(row['id'])
+                    articles.append(row)
+        
+        random.shuffle(articles)
+        return articles
+    
+    def _claim_strategy(self, conn, strategy, count):
+        """
+        Claim up to `count` articles matching a strategy from a random index position.
+
+        Rows another worker is claiming right now are skipped rather than
+        waited on (SKIP LOCKED), and rows under a live lease are filtered out,
+        so concurrent workers always get disjoint batches. times_used and
+        last_processed are bumped in the same statement as the claim.
+        """
+        cursor = conn.cursor()
+        where, params = SELECTION_STRATEGIES[strategy]
+        params = tuple(self.generator_config[name] for name in params)
+        start = random.random()
+        rows = []
         
         try:
-            if strategy == 'fresh':
-                cursor.execute("""
-                    SELECT * FROM wiki_articles 
-                    WHERE last_processed IS NULL 
-                    ORDER BY RANDOM() LIMIT 1
-                """)
-            elif strategy == 'quality':
-                cursor.execute("""
-                    SELECT * FROM wiki_articles 
-                    WHERE quality_score > 7.0 AND times_used < 3
-                    ORDER BY RANDOM() LIMIT 1
-                """)
-            else:
-                cursor.execute("""
-                    SELECT * FROM wiki_articles 
-                    WHERE times_used < 2 AND quality_score > 5.0
-                    ORDER BY RANDOM() LIMIT 1
-                """)
-            
-            row = cursor.fetchone()
-            if row:
-                # Convert row to dict
+            # Above the random start point, then wrap around below it
+            for side in ('above', 'below'):
+                self.pool.execute_prepared(cursor, f"claim_{strategy}_{side}", params + (
+                    start, count - len(rows), self.worker_id, self.generator_config['lease_seconds']))
                 columns = [desc[0] for desc in cursor.description]
-                return dict(zip(columns, row))
+                rows.extend(dict(zip(columns, row)) for row in cursor.fetchall())
+                if len(rows) >= count:
+                    break
+            conn.commit()
         except Exception as e:
-            logging.error(f"Error selecting article: {e}")
+            self.query_failed(conn, f"claiming articles ({strategy})", e)
+            rows = []
+        finally:
+            cursor.close()
+        
+        return rows
+    
+    def check_article_scores(self):
+        """
+        Exit if no article passes MIN_ARTICLE_SCORE.
+
+        Databases imported before articles were scored have every
+        quality_score at 0 or NULL, and would claim nothing forever.
+        """
+        min_score = self.generator_config['min_article_score']
+        passing, unscored = self.pool.run(self.article_scores, min_score)
+        if passing:
+            if unscored:
+                logging.warning("Some articles have no quality_score yet; "
+                                "run scripts/score_articles.py to make them claimable")
+            return
+        message = (f"No article has quality_score >= MIN_ARTICLE_SCORE ({min_score})"
+                   + ("; run scripts/score_articles.py to score existing articles" if unscored else ""))
+        logging.error(message)
+        print(f"Error: {message}")
+        sys.exit(1)
+    
+    def article_scores(self, conn, min_score):
+        """Whether any article scores at least `min_score`, and whether any is unscored."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT EXISTS (SELECT 1 FROM wiki_articles WHERE quality_score >= %s),
+                       EXISTS (SELECT 1 FROM wiki_articles WHERE quality_score IS NULL OR quality_score = 0)
+            """, (min_score,))
+            row = cursor.fetchone()
+            conn.commit()
+            return row
+        finally:
+            cursor.close()
+    
+    def buffer_stats(self, conn, since=None):
+        """
+        Unread posts, posts created after `since` and the database time.
+
+        The time is passed back as `since` next call, so consumption is
+        measured against the database clock and counts every worker's posts.
+        """
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT (SELECT COUNT(*) FROM posts WHERE view_count = 0),
+                       (SELECT COUNT(*) FROM posts WHERE created_at > COALESCE(%s::timestamp, LOCALTIMESTAMP)),
+                       LOCALTIMESTAMP
+            """, (since,))
+            row = cursor.fetchone()
+            conn.commit()
+            return row
+        finally:
+            cursor.close()
+    
+    async def wait_for_readers(self, posts, timeout):
+        """
+        Idle until readers open `posts` unread posts or `timeout` seconds pass.
+
+        Waits on NOTIFY from the posts_consumed trigger, so a full buffer costs
+        no queries; without the trigger this is a plain sleep.
+        """
+        if self.listen_conn is not None and self.listen_conn.closed:
+            self.listen_conn = None  # dropped; LISTEN again on a new connection
+        if self.listen_conn is None:
+            try:
+                self.listen_conn = self.connect()
+                self.listen_conn.autocommit = True
+                self.listen_conn.cursor().execute(f"LISTEN {CONSUMED_CHANNEL}")
+            except Exception as e:
+                logging.error(f"Error listening for consumed posts: {e}")
+                self.listen_conn = None
+                await asyncio.sleep(timeout)
+                return
+        
+        conn = self.listen_conn
+        try:
+            conn.poll()
+        except psycopg2.Error as e:
+            logging.error(f"Lost the LISTEN connection: {e}")
+            await asyncio.sleep(timeout)
+            return
+        conn.notifies.clear()  # already reflected in the last buffer count
+        
+        loop = asyncio.get_running_loop()
+        consumed = asyncio.Event()
+        seen = 0
         
-        return None
+        def on_readable():
+            nonlocal seen
+            conn.poll()
+            seen += len(conn.notifies)
+            conn.notifies.clear()
+            if seen >= posts:
+                consumed.set()
+        
+        loop.add_reader(conn.fileno(), on_readable)
+        try:
+            await asyncio.wait_for(consumed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(conn.fileno())
+    
+    def select_interesting_article(self):
+        """Smart article selection strategy (claims the returned article)."""
+        articles = self.pool.run(self.claim_articles, 1)
+        return articles[0] if articles else None
+    
+    def release_article(self, conn, article_id):
+        """Give back an article this worker claimed but didn't turn into a post."""
+        cursor = conn.cursor()
+        try:
+            self.pool.execute_prepared(cursor, 'release_article', (article_id, self.worker_id))
+            conn.commit()
+        except Exception as e:
+            self.query_failed(conn, f"releasing article {article_id}", e)
+        finally:
+            cursor.close()
+    
+    def end_lease(self, conn, article_id):
+        """Let go of an article without undoing its claim, so it still counts as used."""
+        cursor = conn.cursor()
+        try:
+            self.pool.execute_prepared(cursor, 'end_lease', (article_id, self.worker_id))
+            conn.commit()
+        except Exception as e:
+            self.query_failed(conn, f"ending lease on article {article_id}", e)
+        finally:
+            cursor.close()
     
-    def create_engaging_post(self, article):
-        """Use DeepSeek API to create an engaging social media post from Wikipedia content."""
+    def recent_posts(self, conn):
+        """Posts the near-duplicate index hasn't seen, at most NEAR_DUPLICATE_WINDOW of the newest."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT id, title, tldr, content FROM (
+                    SELECT id, title, tldr, LEFT(content, 3000) AS content FROM posts
+                    WHERE id > %s ORDER BY id DESC LIMIT %s
+                ) recent ORDER BY id
+            """, (self.indexed_through, self.generator_config['near_duplicate_window']))
+            rows = cursor.fetchall()
+            conn.commit()
+            return [dict(zip(('id', 'title', 'tldr', 'content'), row)) for row in rows]
+        except Exception as e:
+            self.query_failed(conn, "loading recent posts", e)
+            return []
+        finally:
+            cursor.close()
+    
+    def index_posts(self, posts):
+        """Add posts from `recent_posts` to the near-duplicate index, oldest first."""
+        for post in posts:
+            # This worker's own posts were indexed when they were saved
+            if post['id'] not in self.near_duplicates.signatures:
+                self.near_duplicates.add(post['id'], self.near_duplicates.signature(post), post['title'])
+            self.indexed_through = max(self.indexed_through, post['id'])
+    
+    def reclaim_expired_leases(self, conn):
+        """Return articles whose lease ran out (crashed or stuck workers) to the pool."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                UPDATE wiki_articles SET {UNDO_CLAIM}
+                WHERE claimed_until < NOW()
+            """)
+            if cursor.rowcount:
+                logging.info(f"Reclaimed {cursor.rowcount} expired article leases")
+            conn.commit()
+        except Exception as e:
+            self.query_failed(conn, "reclaiming leases", e)
+        finally:
+            cursor.close()
+    
+    def post_request(self, article, avoid=()):
+        """chat.completions.create arguments asking for a post about `article`, unlike the `avoid` titles."""
         
         system_prompt = "You are a social media content creator for a Wikipedia-based platform. Your job is to take Wikipedia content and make it FASCINATING."
         
@@ -163,55 +663,68 @@ Format your response as JSON:
 }}
 
 Make it punchy, make it interesting, make people want to read it. Think r/todayilearned quality."""
+        if avoid:
+            published = '\n'.join(f"- {title}" for title in avoid)
+            user_prompt += f"""
+
+We already published these posts. Pick a different fact and angle, and don't reuse their hooks:
+{published}"""
 
+        return dict(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.8,
+            max_tokens=1500,
+            **json_mode()
+        )
+    
+    def post_from_reply(self, response_text, article):
+        """Decode the model's post JSON and attach the article's metadata; raises ValueError."""
+        post_data = decode_json(response_text, required=POST_FIELDS)
+        # The model sometimes sends the score as a string, or null
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.8,
-                max_tokens=1500
-            )
-            
-            response_text = response.choices[0].message.content.strip()
-            
-            # Try to extract JSON from the response
-            # Sometimes AI adds markdown code blocks
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            
-            post_data = json.loads(response_text)
-            
-            # Add metadata
-            post_data['source_article_id'] = article['id']
-            post_data['wiki_url'] = article.get('url', f"https://en.wikipedia.org/wiki/{article['title']}")
-            
-            # Parse images from article
-            if 'images' in article and article['images']:
-                post_data['images'] = article['images']
-            else:
-                post_data['images'] = []
-            
-            return post_data
+            post_data['quality_score'] = float(post_data['quality_score'])
+        except (TypeError, ValueError):
+            raise ValueError(f"quality_score is not a number: {post_data['quality_score']!r}")
+        
+        # Add metadata
+        post_data['source_article_id'] = article['id']
+        post_data['wiki_url'] = article.get('url', f"https://en.wikipedia.org/wiki/{article['title']}")
+        
+        # Parse images from article
+        if 'images' in article and article['images']:
+            post_data['images'] = article['images']
+        else:
+            post_data['images'] = []
+        
+        return post_data
+    
+    async def create_engaging_post(self, article, avoid=()):
+        """Use the LLM to create an engaging social media post from Wikipedia content."""
+        try:
+            response_text = await self.complete('post', **self.post_request(article, avoid))
+            return self.post_from_reply(response_text, article)
         except Exception as e:
             logging.error(f"Error creating post with AI: {e}")
             return None
     
-    def save_post(self, post):
-        """Save generated post to database."""
-        cursor = self.db_conn.cursor()
+    def save_post(self, conn, post, comments=()):
+        """
+        Save a generated post with its `(username, content)` AI comments.
+
+        One statement and one commit: the post, its comments and the end of
+        the article's lease are written together or not at all, and only
+        while this worker holds the lease, so a retried call can't save the
+        post twice. Returns the post id, or None if nothing was saved.
+        """
+        cursor = conn.cursor()
         
         try:
-            cursor.execute("""
-                INSERT INTO posts (title, content, category, tags, images, quality_score, 
-                                 source_article_id, wiki_url, tldr, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-                RETURNING id
-            """, (
+            self.pool.execute_prepared(cursor, 'save_post', (
+                post['source_article_id'],
+                self.worker_id,
                 post['title'],
                 post['content'],
                 post['category'],
@@ -220,64 +733,65 @@ Make it punchy, make it interesting, make people want to read it. Think r/todayi
                 post['quality_score'],
                 post['source_article_id'],
                 post['wiki_url'],
-                post['tldr']
+                post['tldr'],
+                [username for username, _ in comments],
+                [content for _, content in comments],
+                post['source_article_id']
             ))
             
-            post_id = cursor.fetchone()[0]
-            self.db_conn.commit()
-            
-            # Update article metadata
-            cursor.execute("""
-                UPDATE wiki_articles 
-                SET last_processed = NOW(), times_used = times_used + 1
-                WHERE id = %s
-            """, (post['source_article_id'],))
-            self.db_conn.commit()
-            
-            return post_id
+            row = cursor.fetchone()
+            conn.commit()
+            if row is None:
+                logging.warning(f"Lease on article {post['source_article_id']} was lost, post not saved")
+                return None
+            return row[0]
         except Exception as e:
-            logging.error(f"Error saving post: {e}")
-            self.db_conn.rollback()
+            self.query_failed(conn, "saving post", e)
             return None
+        finally:
+            cursor.close()
     
-    def generate_ai_comments(self, post_id, num_comments=5):
-        """Generate AI persona comments for the post."""
-        cursor = self.db_conn.cursor()
-        cursor.execute("SELECT title, content FROM posts WHERE id = %s", (post_id,))
-        post = cursor.fetchone()
-        
-        if not post:
-            return
+    async def generate_ai_comments(self, post, num_comments=5):
+        """Generate AI persona comments for the in-memory post; returns `(username, content)` pairs."""
+        selected_personas = random.sample(PERSONAS, min(num_comments, len(PERSONAS)))
+        comments = {}
+        if self.generator_config['batch_comments']:
+            comments = await self.generate_comment_batch(post, selected_personas)
         
-        # Different AI personas
-        personas = [
-            {"name": "HistoryBuff1987", "style": "enthusiastic historian, loves to add context"},
-            {"name": "ScienceNerd_", "style": "skeptical scientist, asks good questions"},
-            {"name": "CasualLurker", "style": "casual reader, reacts with 'wow' and simple thoughts"},
-            {"name": "DevilsAdvocate99", "style": "contrarian who politely challenges assumptions"},
-            {"name": "FunFactBot", "style": "adds related fun facts and connections"},
-            {"name": "SourceChecker", "style": "asks for sources and verification"},
-            {"name": "ELI5_Please", "style": "asks for simpler explanations"},
-            {"name": "PunMaster3000", "style": "makes dad jokes and puns about the topic"},
-        ]
+        # One request per persona the batch didn't cover
+        missing = [persona for persona in selected_personas if persona['name'] not in comments]
+        singles = await asyncio.gather(*(
+            self.generate_single_comment((post['title'], post['content']), persona)
+            for persona in missing
+        ))
+        comments.update((persona['name'], comment) for persona, comment in zip(missing, singles))
         
-        selected_personas = random.sample(personas, min(num_comments, len(personas)))
-        
-        for persona in selected_personas:
-            try:
-                comment = self.generate_single_comment(post, persona)
-                if comment:
-                    cursor.execute("""
-                        INSERT INTO comments (post_id, username, content, is_ai, created_at)
-                        VALUES (%s, %s, %s, true, NOW())
-                    """, (post_id, persona['name'], comment))
-            
-            except Exception as e:
-                logging.error(f"Error generating comment: {e}")
+        return [(persona['name'], comments[persona['name']])
+                for persona in selected_personas if comments.get(persona['name'])]
+    
+    def comment_batch_request(self, post, personas):
+        """chat.completions.create arguments asking for every persona's comment on `post`."""
+        return dict(
+            messages=batch_comment_messages(post['title'], post['content'], personas),
+            temperature=0.9,
+            max_tokens=batch_max_tokens(personas),
+            **json_mode()
+        )
+    
+    async def generate_comment_batch(self, post, personas):
+        """Ask for every persona's comment in one request; returns the valid ones by name."""
+        try:
+            response_text = await self.complete('comment', **self.comment_batch_request(post, personas))
+        except Exception as e:
+            logging.error(f"Error generating comment batch: {e}")
+            return {}
         
-        self.db_conn.commit()
+        comments = parse_comment_batch(response_text, personas)
+        if len(comments) < len(personas):
+            logging.info(f"Comment batch covered {len(comments)}/{len(personas)} personas")
+        return comments
     
-    def generate_single_comment(self, post, persona):
+    async def generate_single_comment(self, post, persona):
         """Generate a single AI comment in a specific persona."""
         system_prompt = f"You are {persona['name']}, a commenter on a Wikipedia social feed. Your style: {persona['style']}"
         
@@ -289,8 +803,8 @@ Be conversational, natural, like a real Reddit comment. No hashtags. No emojis (
 Just respond with the comment text, nothing else."""
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            return await self.complete(
+                'comment',
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
@@ -298,31 +812,104 @@ Just respond with the comment text, nothing else."""
                 temperature=0.9,
                 max_tokens=200
             )
-            return response.choices[0].message.content.strip()
         except Exception as e:
             logging.error(f"Error generating comment: {e}")
             return None
 
 
-def main():
+async def run_generator(generator):
     """Main execution loop."""
-    generator = WikiPostGenerator()
+    config = generator.generator_config
+    if config['target_post_buffer'] <= 0:
+        await run_fixed_batches(generator)
+        return
     
+    scheduler = BufferScheduler(config['target_post_buffer'], config['max_batch_size'], generator.workers)
+    delay = config['batch_delay_seconds']
+    while True:
+        try:
+            depth, produced, now = await generator.db(generator.buffer_stats, scheduler.since)
+            scheduler.observe(depth, produced, now)
+            batch_size = scheduler.batch_size()
+            
+            if not batch_size:
+                print(f"[{datetime.now()}] Buffer full ({depth}/{scheduler.target} unread), waiting for readers...")
+                await generator.wait_for_readers(scheduler.refill_at(), delay)
+                continue
+            
+            print(f"[{datetime.now()}] Buffer at {depth}/{scheduler.target} unread, generating {batch_size} posts...")
+            generated = await generator.generate_post_batch(batch_size)
+            scheduler.record_batch(generator.last_claimed, generated)
+            logging.info(f"Buffer {depth}/{scheduler.target}, consumption {scheduler.consumption:.3f}/s, "
+                         f"acceptance {scheduler.acceptance:.2f}")
+            
+            if not generator.last_claimed:
+                print(f"No articles available, waiting {delay} seconds...")
+                await asyncio.sleep(delay)
+        
+        except Exception as e:
+            logging.error(f"Fatal error: {e}")
+            await asyncio.sleep(60)  # Wait before retrying
+
+
+async def run_fixed_batches(generator):
+    """Execution loop without a buffer target: BATCH_SIZE posts every BATCH_DELAY_SECONDS."""
     while True:
         try:
             print(f"[{datetime.now()}] Generating post batch...")
-            generator.generate_post_batch()
+            await generator.generate_post_batch()
             
             delay = generator.generator_config['batch_delay_seconds']
             print(f"Waiting {delay} seconds until next batch...")
-            time.sleep(delay)
+            await asyncio.sleep(delay)
         
-        except KeyboardInterrupt:
-            logging.info("Generator stopped by user")
-            break
         except Exception as e:
             logging.error(f"Fatal error: {e}")
-            time.sleep(60)  # Wait before retrying
+            await asyncio.sleep(60)  # Wait before retrying
+
+
+def run_worker(workers=1):
+    """Generation loop for one worker process."""
+    generator = WikiPostGenerator(workers)
+    generator.check_article_scores()
+    try:
+        asyncio.run(run_generator(generator))
+    except KeyboardInterrupt:
+        logging.info("Generator stopped by user")
+
+
+def main():
+    """Run one or more generator workers, or an offline batch job."""
+    parser = argparse.ArgumentParser(description='Wikifeedia AI content generator')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('GENERATOR_WORKERS', 1)),
+                        help='Generator processes to run on this host')
+    commands = parser.add_subparsers(dest='command')
+    batch_parser = commands.add_parser('batch', help='Generate a large backfill as an offline batch job')
+    args, _ = parser.parse_known_args()
+    if args.command == 'batch':
+        import batch_generation  # imports this module
+        batch_generation.add_arguments(batch_parser)
+        args = parser.parse_args()
+        generator = WikiPostGenerator()
+        generator.check_article_scores()
+        batch_generation.run_batch_job(generator, args)
+        return
+    args = parser.parse_args()
+    
+    if args.workers <= 1:
+        run_worker()
+        return
+    
+    # Each worker opens its own DB connection and claims its own batches
+    processes = [multiprocessing.Process(target=run_worker, args=(args.workers,), name=f'generator-{i}')
+                 for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logging.info("Generator stopped by user")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,21 @@
+-- Unique keys on wiki_articles so re-running an import is idempotent.
+-- `ON CONFLICT DO NOTHING` in import_wiki_to_db.py only skips duplicates
+-- when a unique constraint exists.
+
+ALTER TABLE wiki_articles ADD COLUMN IF NOT EXISTS page_id INTEGER; -- Wikipedia page id
+
+-- Collapse duplicate titles left by earlier imports onto the oldest row
+WITH ranked AS (
+    SELECT id, MIN(id) OVER (PARTITION BY title) AS keep_id
+    FROM wiki_articles
+)
+UPDATE posts p SET source_article_id = r.keep_id
+FROM ranked r
+WHERE p.source_article_id = r.id AND r.id <> r.keep_id;
+
+DELETE FROM wiki_articles a
+USING wiki_articles b
+WHERE a.title = b.title AND a.id > b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_wiki_title ON wiki_articles(title);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_wiki_page_id ON wiki_articles(page_id);
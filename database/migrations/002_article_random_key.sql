@@ -0,0 +1,16 @@
+-- Indexed random sampling for article selection.
+-- Each article gets a stored random key; picking articles is an index range
+-- scan from a random point (`random_key >= r ORDER BY random_key LIMIT n`)
+-- on a partial index per selection strategy, instead of ORDER BY RANDOM()
+-- over the whole table. Keys are re-drawn when an article is claimed, in the
+-- claim statement (content_generator.claim_articles).
+
+ALTER TABLE wiki_articles ADD COLUMN IF NOT EXISTS random_key DOUBLE PRECISION NOT NULL DEFAULT random();
+
+-- One partial index per strategy in content_generator.SELECTION_STRATEGIES
+CREATE INDEX IF NOT EXISTS idx_wiki_fresh ON wiki_articles(random_key)
+    WHERE last_processed IS NULL;
+CREATE INDEX IF NOT EXISTS idx_wiki_quality ON wiki_articles(random_key)
+    WHERE quality_score > 7.0 AND times_used < 3;
+CREATE INDEX IF NOT EXISTS idx_wiki_underused ON wiki_articles(random_key)
+    WHERE times_used < 2 AND quality_score > 5.0;
@@ -0,0 +1,10 @@
+-- Lease-based claims so several generator processes can share wiki_articles.
+-- A worker claims a batch with FOR UPDATE SKIP LOCKED, which also bumps
+-- times_used/last_processed, and holds the lease until its post is saved.
+-- Leases left behind by crashed workers expire and are rolled back.
+
+ALTER TABLE wiki_articles ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(100); -- host:pid of the claiming worker
+ALTER TABLE wiki_articles ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_wiki_claims ON wiki_articles(claimed_until)
+    WHERE claimed_until IS NOT NULL;
@@ -0,0 +1,20 @@
+-- Demand-driven generation: the generator keeps the number of unread posts
+-- (view_count = 0) near TARGET_POST_BUFFER. The partial index keeps the
+-- buffer count cheap, and the trigger wakes idle generators (LISTEN
+-- posts_consumed) as soon as a reader opens an unread post.
+
+CREATE INDEX IF NOT EXISTS idx_posts_unread ON posts(created_at) WHERE view_count = 0;
+
+CREATE OR REPLACE FUNCTION notify_post_consumed() RETURNS trigger AS $$
+BEGIN
+    IF OLD.view_count = 0 AND NEW.view_count > 0 THEN
+        PERFORM pg_notify('posts_consumed', NEW.id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS posts_consumed ON posts;
+CREATE TRIGGER posts_consumed
+    AFTER UPDATE OF view_count ON posts
+    FOR EACH ROW EXECUTE FUNCTION notify_post_consumed();
@@ -3,20 +3,30 @@
 -- Wikipedia articles table (original content)
 CREATE TABLE wiki_articles (
     id SERIAL PRIMARY KEY,
-    title VARCHAR(500) NOT NULL,
+    page_id INTEGER UNIQUE, -- Wikipedia page id
+    title VARCHAR(500) NOT NULL UNIQUE,
     content TEXT NOT NULL,
     url VARCHAR(500),
     categories TEXT[], -- Wikipedia's own categories
     images TEXT[], -- Extracted image URLs from article
     last_processed TIMESTAMP,
     times_used INTEGER DEFAULT 0,
-    quality_score FLOAT -- AI-assigned interestingness score
+    quality_score FLOAT, -- AI-assigned interestingness score
+    random_key DOUBLE PRECISION NOT NULL DEFAULT random(), -- indexed sampling key
+    claimed_by VARCHAR(100), -- host:pid of the generator worker holding the lease
+    claimed_until TIMESTAMP -- lease expiry
 );
 
 CREATE INDEX idx_categories ON wiki_articles USING GIN(categories);
 CREATE INDEX idx_quality ON wiki_articles(quality_score DESC);
 CREATE INDEX idx_times_used ON wiki_articles(times_used);
 
+-- Partial indexes for each article selection strategy (see content_generator.py)
+CREATE INDEX idx_wiki_fresh ON wiki_articles(random_key) WHERE last_processed IS NULL;
+CREATE INDEX idx_wiki_quality ON wiki_articles(random_key) WHERE quality_score > 7.0 AND times_used < 3;
+CREATE INDEX idx_wiki_underused ON wiki_articles(random_key) WHERE times_used < 2 AND quality_score > 5.0;
+CREATE INDEX idx_wiki_claims ON wiki_articles(claimed_until) WHERE claimed_until IS NOT NULL;
+
 -- Generated posts table
 CREATE TABLE posts (
     id SERIAL PRIMARY KEY,
@@ -36,7 +46,24 @@ CREATE TABLE posts (
 
 CREATE INDEX idx_category ON posts(category);
 CREATE INDEX idx_created_at ON posts(created_at DESC);
-CREATE INDEX idx_quality ON posts(quality_score DESC);
+CREATE INDEX idx_posts_quality ON posts(quality_score DESC);
+
+-- Unread posts the generator keeps topped up (see content_generator.py)
+CREATE INDEX idx_posts_unread ON posts(created_at) WHERE view_count = 0;
+
+-- Wake idle generators when a reader opens an unread post
+CREATE OR REPLACE FUNCTION notify_post_consumed() RETURNS trigger AS $$
+BEGIN
+    IF OLD.view_count = 0 AND NEW.view_count > 0 THEN
+        PERFORM pg_notify('posts_consumed', NEW.id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER posts_consumed
+    AFTER UPDATE OF view_count ON posts
+    FOR EACH ROW EXECUTE FUNCTION notify_post_consumed();
 
 -- Comments table
 CREATE TABLE comments (
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Self-healing psycopg2 connection pool for the long-running generator.
+
+One shared connection wedges a 24/7 process the first time Postgres restarts
+or a TCP session drops: every later query fails until someone restarts it.
+The pool instead:
+
+- hands each caller (thread) its own connection, so concurrent tasks check
+  out connections independently, up to `size` at once;
+- health-checks connections that sat idle for a while before handing them
+  out, and replaces ones that are closed or fail the check;
+- drops a connection that broke during use, and `run` retries the whole
+  unit of work on a fresh one with backoff (transparent reconnect), so
+  work that writes must be idempotent;
+- keeps per-connection server-side prepared statements for hot queries,
+  re-preparing them on new connections as needed.
+
+Statement timeouts and TCP keepalives are set by the `connect` function the
+pool is given (see WikiPostGenerator.connect).
+"""
+
+import logging
+import re
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+# Reconnect backoff: 1s, 2s, 4s ... capped
+MAX_BACKOFF = 30
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No connection became free within the checkout timeout."""
+
+
+def numbered_params(sql):
+    """Turn psycopg2 %s placeholders into PREPARE's $1, $2, ..."""
+    counter = iter(range(1, sql.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f"${next(counter)}", sql)
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections that replaces broken ones."""
+
+    def __init__(self, connect, size=4, check_after=30, checkout_timeout=30, reconnect_attempts=5):
+        self._connect = connect
+        self.size = size
+        self.check_after = check_after
+        self.checkout_timeout = checkout_timeout
+        self.reconnect_attempts = reconnect_attempts
+        self.statements = {}
+        self._idle = []      # (connection, monotonic time it was returned)
+        self._open = 0
+        self._prepared = {}  # connection -> names prepared on it
+        self._cond = threading.Condition()
+
+    def register(self, name, sql):
+        """Declare a statement to run with execute_prepared; `sql` uses %s placeholders."""
+        self.statements[name] = numbered_params(sql)
+
+    def _alive(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._prepared.pop(conn, None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        """Check out a healthy connection, opening one if the pool has room."""
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"no database connection free after {self.checkout_timeout}s")
+                self._cond.wait(remaining)
+            if self._idle:
+                conn, returned = self._idle.pop()
+            else:
+                conn, returned = None, None
+                self._open += 1
+
+        if conn is not None:
+            stale = time.monotonic() - returned > self.check_after
+            if not conn.closed and (not stale or self._alive(conn)):
+                return conn
+            logging.warning("Replacing dead database connection")
+            self._discard(conn)
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn):
+        """Return a connection; broken ones are closed and their slot freed."""
+        if not conn.closed and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()  # never hand out a connection mid-transaction
+            except psycopg2.Error:
+                pass
+        with self._cond:
+            if conn.closed:
+                self._discard(conn)
+                self._open -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def connection(self):
+        """`with pool.connection() as conn:` -- checked out for the block."""
+        return _Checkout(self)
+
+    def run(self, fn, *args):
+        """
+        Call `fn(conn, *args)` on a pooled connection.
+
+        If the connection is lost while `fn` runs, the work is retried from
+        the start on a fresh connection, with backoff while the database is
+        unreachable. `fn` should therefore commit once, at its end, and be
+        safe to run again after that commit: the connection can drop after
+        the server committed but before the client heard back, and the retry
+        can't tell (see WikiPostGenerator.save_post).
+        """
+        for attempt in range(self.reconnect_attempts + 1):
+            try:
+                conn = self.getconn()
+            except psycopg2.OperationalError as e:
+                if attempt == self.reconnect_attempts or isinstance(e, PoolTimeout):
+                    raise
+                self._backoff(attempt, e)
+                continue
+            try:
+                return fn(conn, *args)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if not conn.closed or attempt == self.reconnect_attempts:
+                    raise
+                # The server probably restarted; its other connections are gone too
+                self.close()
+                self._backoff(attempt, e)
+            finally:
+                self.putconn(conn)
+
+    def _backoff(self, attempt, error):
+        delay = min(2 ** attempt, MAX_BACKOFF)
+        reason = ' '.join(str(error).split()) or type(error).__name__
+        logging.warning(f"Database connection lost ({reason}), reconnecting in {delay}s")
+        time.sleep(delay)
+
+    def execute_prepared(self, cursor, name, params=()):
+        """Run a registered statement, preparing it on this connection the first time."""
+        conn = cursor.connection
+        prepared = self._prepared.setdefault(conn, set())
+        if name not in prepared:
+            cursor.execute(f"PREPARE {name} AS {self.statements[name]}")
+            prepared.add(name)
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def close(self):
+        """Close the idle connections; ones checked out are closed when returned broken."""
+        with self._cond:
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._open -= len(self._idle)
+            self._idle = []
+
+
+class _Checkout:
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __enter__(self):
+        self._conn = self._pool.getconn()
+        return self._conn
+
+    def __exit__(self, *exc):
+        self._pool.putconn(self._conn)
+        return False
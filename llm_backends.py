@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Pluggable LLM backends with task routing, weighted load-balancing and failover.
+
+Every Python entry point gets its client from `make_client`. The client
+looks like an OpenAI client, but `chat.completions.create` takes a `task`
+("post", "comment", ...) instead of a model. Each backend is an
+OpenAI-compatible endpoint (DeepSeek, a local Ollama, the mock server)
+wrapped with its own rate limits, retries and circuit breaker (llm_client.py)
+and the shared response cache (llm_cache.py). A request for a task:
+
+- orders the task's backends by a weighted random draw, with backends whose
+  circuit breaker is open moved to the back;
+- waits for a free slot under the backend's concurrency limit and sends the
+  request with that backend's model (dropping `response_format` for
+  backends without JSON mode);
+- fails over to the next backend if one errors out after its own retries.
+
+Routes are "name[:weight],..." lists. Weight 0 makes a backend failover-only,
+so by default posts go to DeepSeek and only fall back to Ollama, while
+comments, the bulk of the traffic, go mostly to Ollama.
+
+Configuration (environment):
+    LLM_BACKENDS               enabled backends, in order (default "deepseek"; e.g. "deepseek,ollama")
+    LLM_ROUTE_<TASK>           route for a task, e.g. LLM_ROUTE_COMMENT=ollama:3,deepseek:1
+    <NAME>_BASE_URL            endpoint (DeepSeek: LLM_BASE_URL, then the DeepSeek API;
+                               Ollama: http://localhost:11434/v1)
+    <NAME>_MODEL               model (deepseek-chat, gemma2:4b)
+    <NAME>_API_KEY             key (DeepSeek: DEEPSEEK_API_KEY)
+    <NAME>_CONCURRENCY         requests in flight per process (DeepSeek 0 = unlimited, Ollama 2)
+    <NAME>_JSON_MODE           backend accepts response_format (default true)
+    <NAME>_REQUESTS_PER_MINUTE / <NAME>_TOKENS_PER_MINUTE
+                               budgets (DeepSeek: the LLM_* defaults in llm_client.py;
+                               other backends unlimited)
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+from types import SimpleNamespace
+
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from llm_cache import CachedClient, from_env
+from llm_client import DEEPSEEK_BASE_URL, CircuitOpenError, ResilientClient
+
+OLLAMA_BASE_URL = "http://localhost:11434/v1"
+
+# Built-in settings for the backends we know; any other name is a generic
+# OpenAI-compatible endpoint configured entirely through <NAME>_* variables
+BACKEND_DEFAULTS = {
+    'deepseek': {'base_url': DEEPSEEK_BASE_URL, 'model': 'deepseek-chat', 'concurrency': 0},
+    'ollama': {'base_url': OLLAMA_BASE_URL, 'model': 'gemma2:4b', 'concurrency': 2, 'api_key': 'ollama'},
+}
+
+# Routes used when LLM_ROUTE_<TASK> isn't set; backends that aren't enabled are skipped
+DEFAULT_ROUTES = {
+    'post': 'deepseek:1,ollama:0',
+    'comment': 'ollama:3,deepseek:1',
+}
+
+
+def parse_route(spec):
+    """"a:3,b:1,c:0" -> [('a', 3.0), ('b', 1.0), ('c', 0.0)]; a missing weight means 1."""
+    route = []
+    for part in spec.split(','):
+        name, _, weight = part.strip().partition(':')
+        if name:
+            route.append((name.strip().lower(), float(weight) if weight else 1.0))
+    return route
+
+
+def weighted_order(route):
+    """Backends in a weighted random order (without replacement), failover-only ones last."""
+    weighted = [(name, weight) for name, weight in route if weight > 0]
+    order = []
+    while weighted:
+        pick = random.uniform(0, sum(weight for _, weight in weighted))
+        for i, (name, weight) in enumerate(weighted):
+            pick -= weight
+            if pick <= 0 or i == len(weighted) - 1:
+                order.append(name)
+                del weighted[i]
+                break
+    return order + [name for name, weight in route if weight <= 0]
+
+
+class Backend:
+    """One OpenAI-compatible endpoint with its model, concurrency limit and resilient client."""
+
+    def __init__(self, name, client, model, concurrency=0, json_mode=True, cache=None):
+        self.name = name
+        self.model = model
+        self.json_mode = json_mode
+        self.concurrency = concurrency
+        self.resilient = client
+        self.client = CachedClient(client, cache) if cache else client
+        self.requests = 0
+        self.failovers = 0
+        self._slots = threading.BoundedSemaphore(concurrency) if concurrency else None
+        self._async_slots = None  # asyncio.Semaphore, created on the running loop
+
+    @property
+    def breaker(self):
+        return self.resilient.breaker
+
+    def params(self, kwargs):
+        params = dict(kwargs, model=self.model)
+        if not self.json_mode:
+            params.pop('response_format', None)
+        return params
+
+    def create(self, **kwargs):
+        self.requests += 1
+        if self._slots is None:
+            return self.client.chat.completions.create(**self.params(kwargs))
+        with self._slots:
+            return self.client.chat.completions.create(**self.params(kwargs))
+
+    async def create_async(self, **kwargs):
+        self.requests += 1
+        if not self.concurrency:
+            return await self.client.chat.completions.create(**self.params(kwargs))
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.concurrency)
+        async with self._async_slots:
+            return await self.client.chat.completions.create(**self.params(kwargs))
+
+
+def is_failover(error):
+    """Errors worth trying another backend for (the backend already did its own retries)."""
+    return isinstance(error, (openai.APIError, CircuitOpenError))
+
+
+class _RoutedCompletions:
+    def __init__(self, router, async_client):
+        self._router = router
+        if async_client:
+            self.create = self._create_async
+
+    def create(self, task='default', **kwargs):
+        candidates = self._router.candidates(task)
+        for i, backend in enumerate(candidates):
+            try:
+                return backend.create(**kwargs)
+            except Exception as e:
+                if not is_failover(e) or i == len(candidates) - 1:
+                    raise
+                self._router.failed(backend, task, e)
+
+    async def _create_async(self, task='default', **kwargs):
+        candidates = self._router.candidates(task)
+        for i, backend in enumerate(candidates):
+            try:
+                return await backend.create_async(**kwargs)
+            except Exception as e:
+                if not is_failover(e) or i == len(candidates) - 1:
+                    raise
+                self._router.failed(backend, task, e)
+
+
+class LLMRouter:
+    """
+    OpenAI-style client that sends each request to one of the backends
+    routed for its task, failing over to the others in turn.
+    """
+
+    def __init__(self, backends, routes=None, cache=None, async_client=False):
+        self.backends = {backend.name: backend for backend in backends}
+        self.routes = {task: [(name, weight) for name, weight in route if name in self.backends]
+                       for task, route in (routes or {}).items()}
+        self.cache = cache
+        self.chat = SimpleNamespace(completions=_RoutedCompletions(self, async_client))
+
+    def route(self, task):
+        """Weighted backends for `task`; every backend, equally weighted, if it has no route."""
+        return self.routes.get(task) or [(name, 1.0) for name in self.backends]
+
+    def model_for(self, task):
+        """Model of the backend most requests for `task` go to."""
+        name, _ = max(self.route(task), key=lambda entry: entry[1])
+        return self.backends[name].model
+
+    def candidates(self, task):
+        """Backends to try for one request, in order."""
+        order = [self.backends[name] for name in weighted_order(self.route(task))]
+        # Backends that are cooling down are only tried once the others have failed
+        return sorted(order, key=lambda backend: backend.breaker.retry_in() > 0)
+
+    def failed(self, backend, task, error):
+        backend.failovers += 1
+        logging.warning(f"LLM backend {backend.name} failed for {task} ({type(error).__name__}), failing over")
+
+    def retry_in(self):
+        """Seconds until any backend accepts requests again (0 if one does now)."""
+        return min(backend.breaker.retry_in() for backend in self.backends.values())
+
+    def stats(self):
+        return {name: {'model': backend.model, 'requests': backend.requests, 'failovers': backend.failovers,
+                       'breaker_open': backend.breaker.retry_in() > 0}
+                for name, backend in self.backends.items()}
+
+
+def backend_setting(name, key, default=None):
+    return os.getenv(f"{name.upper()}_{key}", default)
+
+
+def make_backend(name, api_key, async_client=False, share=1, cache=None):
+    """Build one backend from its <NAME>_* environment variables and built-in defaults."""
+    defaults = BACKEND_DEFAULTS.get(name, {})
+    base_url = backend_setting(name, 'BASE_URL', defaults.get('base_url'))
+    if name == 'deepseek':
+        # LLM_BASE_URL predates multiple backends (e.g. the mock server in benchmarks)
+        base_url = os.getenv('LLM_BASE_URL', base_url)
+        rpm = backend_setting(name, 'REQUESTS_PER_MINUTE', os.getenv('LLM_REQUESTS_PER_MINUTE', 60))
+        tpm = backend_setting(name, 'TOKENS_PER_MINUTE', os.getenv('LLM_TOKENS_PER_MINUTE', 0))
+    else:
+        rpm = backend_setting(name, 'REQUESTS_PER_MINUTE', 0)
+        tpm = backend_setting(name, 'TOKENS_PER_MINUTE', 0)
+    if not base_url:
+        raise ValueError(f"LLM backend {name} needs {name.upper()}_BASE_URL")
+
+    key = backend_setting(name, 'API_KEY', api_key if name == 'deepseek' else defaults.get('api_key', api_key))
+    client_class = AsyncOpenAI if async_client else OpenAI
+    client = ResilientClient(
+        client_class(api_key=key or 'none', base_url=base_url),
+        requests_per_minute=float(rpm) / share,
+        tokens_per_minute=float(tpm) / share,
+        max_retries=int(os.getenv('LLM_MAX_RETRIES', 6)),
+        breaker_failures=int(os.getenv('LLM_BREAKER_FAILURES', 5)),
+        breaker_reset_seconds=float(os.getenv('LLM_BREAKER_RESET_SECONDS', 60))
+    )
+
+    concurrency = int(backend_setting(name, 'CONCURRENCY', defaults.get('concurrency', 0)))
+    json_mode = backend_setting(name, 'JSON_MODE', 'true').lower() in ('1', 'true', 'yes')
+    return Backend(name, client, backend_setting(name, 'MODEL', defaults.get('model')),
+                   concurrency=max(1, concurrency // share) if concurrency else 0,
+                   json_mode=json_mode, cache=cache)
+
+
+def make_client(api_key, async_client=False, share=1, cache=True):
+    """
+    Build the routed LLM client every entry point uses.
+
+    `api_key` is the DeepSeek key. `share` splits the per-minute budgets and
+    concurrency limits between that many processes on this host
+    (e.g. content_generator.py --workers).
+    """
+    cache = from_env() if cache else None
+    names = [name for name, _ in parse_route(os.getenv('LLM_BACKENDS', 'deepseek'))]
+    backends = [make_backend(name, api_key, async_client, share, cache) for name in names]
+
+    routes = {task: parse_route(spec) for task, spec in DEFAULT_ROUTES.items()}
+    for variable, spec in os.environ.items():
+        if variable.startswith('LLM_ROUTE_') and spec:
+            routes[variable[len('LLM_ROUTE_'):].lower()] = parse_route(spec)
+    return LLMRouter(backends, routes, cache=cache, async_client=async_client)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for chat completions.
+
+Responses are stored in a local SQLite file keyed on a hash of the model,
+messages and sampling parameters, so re-running the same prompt (test
+scripts, the control panel's fixed sample articles, reprocessing runs)
+doesn't pay for the same completion twice. Entries expire after a TTL and
+the least recently used ones are evicted once the file grows past a size
+limit.
+
+Only deterministic requests (temperature 0) are cached unless sampled
+caching is switched on, since a cached reply to a temperature 0.8 prompt
+always comes back identical.
+
+Configuration (environment):
+    LLM_CACHE           path of the SQLite file, or "off" (default .llm_cache.sqlite)
+    LLM_CACHE_TTL_DAYS  days before an entry expires (default 30)
+    LLM_CACHE_MAX_MB    size limit before LRU eviction (default 256)
+    LLM_CACHE_SAMPLED   also cache temperature > 0 requests (default false)
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+DEFAULT_PATH = '.llm_cache.sqlite'
+
+# Check the size limit every this many writes rather than on every one
+EVICT_EVERY = 100
+
+
+def cache_key(model, messages, **params):
+    """Stable hash of everything that determines a completion."""
+    payload = json.dumps({'model': model, 'messages': messages, 'params': params},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed completion cache with TTL and size-bounded LRU eviction."""
+
+    def __init__(self, path=DEFAULT_PATH, ttl_seconds=30 * 86400, max_bytes=256 * 1024 * 1024,
+                 cache_sampled=False):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.cache_sampled = cache_sampled
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+
+    def cacheable(self, params):
+        """Whether a request with these sampling parameters may be served from the cache."""
+        if params.get('stream') or params.get('n', 1) != 1:
+            return False
+        return self.cache_sampled or not params.get('temperature', 1.0)
+
+    def get(self, key):
+        """Cached response text for `key`, or None (expired entries count as misses)."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                self._db.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                                 (now, key))
+                self.hits += 1
+                return row[0]
+            if row:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock:
+            self._db.execute("""
+                INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, model, response, len(response.encode('utf-8')), now, now))
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'entries': entries,
+            'bytes': size,
+        }
+
+    def close(self):
+        self._db.close()
+
+
+def from_env():
+    """Build the cache configured by the LLM_CACHE* environment variables, or None if it is off."""
+    path = os.getenv('LLM_CACHE', DEFAULT_PATH)
+    if path.lower() in ('', 'off', 'false', '0'):
+        return None
+    return LLMCache(
+        path,
+        ttl_seconds=float(os.getenv('LLM_CACHE_TTL_DAYS', 30)) * 86400,
+        max_bytes=int(float(os.getenv('LLM_CACHE_MAX_MB', 256)) * 1024 * 1024),
+        cache_sampled=os.getenv('LLM_CACHE_SAMPLED', 'false').lower() in ('1', 'true', 'yes')
+    )
+
+
+def _cached_response(text):
+    """Minimal stand-in for a ChatCompletion carrying a cached reply."""
+    message = SimpleNamespace(role='assistant', content=text)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')],
+                           usage=None, cached=True)
+
+
+class _CachedCompletions:
+    def __init__(self, completions, cache):
+        self._completions = completions
+        self._cache = cache
+        # The SDK decorates its async create with a sync wrapper; look through it
+        if inspect.iscoroutinefunction(inspect.unwrap(completions.create)):
+            self.create = self._create_async
+
+    def _lookup(self, kwargs):
+        if not self._cache.cacheable(kwargs):
+            return None, None
+        key = cache_key(**kwargs)
+        return key, self._cache.get(key)
+
+    def _store(self, key, kwargs, response):
+        content = response.choices[0].message.content
+        if key and content is not None:
+            self._cache.put(key, kwargs['model'], content)
+
+    def create(self, **kwargs):
+        key, text = self._lookup(kwargs)
+        if text is not None:
+            return _cached_response(text)
+        response = self._completions.create(**kwargs)
+        self._store(key, kwargs, response)
+        return response
+
+    async def _create_async(self, **kwargs):
+        key, text = self._lookup(kwargs)
+        if text is not None:
+            return _cached_response(text)
+        response = await self._completions.create(**kwargs)
+        self._store(key, kwargs, response)
+        return response
+
+
+class CachedClient:
+    """
+    Wrap an OpenAI or AsyncOpenAI client so `chat.completions.create` goes
+    through the cache. Everything else is passed straight to the client.
+    """
+
+    def __init__(self, client, cache):
+        self._client = client
+        self.cache = cache
+        self.chat = SimpleNamespace(completions=_CachedCompletions(client.chat.completions, cache))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
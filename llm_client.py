@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Shared DeepSeek client with rate limiting, retries and a circuit breaker.
+
+Each LLM backend (llm_backends.py) wraps its OpenAI-compatible client in a
+ResilientClient, so that each `chat.completions.create` call:
+
+- waits for room in token buckets for requests/min and tokens/min, so we
+  stay under quota instead of collecting 429s;
+- retries rate limits, timeouts, connection errors and 5xx responses with
+  jittered exponential backoff, never sooner than the server's Retry-After;
+- fails fast with CircuitOpenError once failures keep piling up, until a
+  cool-down has passed and a trial request succeeds.
+
+The client is wrapped by the response cache (llm_cache.py) on top, so cache
+hits don't spend quota.
+
+Configuration (environment):
+    LLM_BASE_URL               DeepSeek endpoint override (e.g. scripts/mock_llm_server.py)
+    LLM_REQUESTS_PER_MINUTE    DeepSeek request budget (default 60, 0 = unlimited)
+    LLM_TOKENS_PER_MINUTE      DeepSeek prompt + completion token budget (default 0 = unlimited)
+    LLM_MAX_RETRIES            retries per request (default 6)
+    LLM_BREAKER_FAILURES       consecutive failures that open the breaker (default 5)
+    LLM_BREAKER_RESET_SECONDS  how long the breaker stays open (default 60)
+"""
+
+import asyncio
+import inspect
+import logging
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+
+# Rough prompt size estimate used for the token budget before usage is known
+CHARS_PER_TOKEN = 4
+
+# HTTP statuses worth retrying
+RETRY_STATUSES = (408, 409, 429)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+    def __init__(self, retry_in):
+        super().__init__(f"LLM circuit breaker open, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `per_minute` tokens per minute.
+
+    `reserve` takes tokens right away, even into debt, and returns how long
+    the caller must wait before using them. Callers queue up fairly in
+    reservation order, and the sync and async paths can share the same bucket.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+    def refund(self, amount):
+        """Give back tokens that were reserved but not used."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one trial through after `reset_seconds`."""
+
+    def __init__(self, threshold=5, reset_seconds=60.0):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        """Seconds until requests are allowed again (0 when closed)."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call may not go ahead; returns True for the half-open trial."""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            wait = self.retry_in()
+            if wait > 0 or self._trial:
+                raise CircuitOpenError(wait or self.reset_seconds)
+            self._trial = True  # half-open: this call decides
+            return True
+
+    def end_trial(self):
+        """Let another call be the trial when this one ended without success or a retryable failure."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logging.info("LLM circuit breaker closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                if self.opened_at is None or self._trial:
+                    logging.warning(f"LLM circuit breaker open after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+
+def is_retryable(error):
+    if isinstance(error, openai.APIConnectionError):  # includes timeouts
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRY_STATUSES or error.status_code >= 500
+    return False
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, if it said."""
+    response = getattr(error, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def estimate_tokens(kwargs):
+    prompt = sum(len(str(message.get('content', ''))) for message in kwargs.get('messages', ()))
+    return prompt // CHARS_PER_TOKEN + kwargs.get('max_tokens', 1000)
+
+
+class _ResilientCompletions:
+    def __init__(self, completions, owner):
+        self._completions = completions
+        self._owner = owner
+        # The SDK decorates its async create with a sync wrapper; look through it
+        if inspect.iscoroutinefunction(inspect.unwrap(completions.create)):
+            self.create = self._create_async
+
+    def create(self, **kwargs):
+        owner = self._owner
+        for attempt in range(owner.max_retries + 1):
+            trial = owner.breaker.before_call()
+            try:
+                estimate, wait = owner.reserve(kwargs)
+                if wait:
+                    time.sleep(wait)
+                try:
+                    response = self._completions.create(**kwargs)
+                except Exception as e:
+                    delay = owner.on_error(e, attempt, estimate)
+                    if delay is None:
+                        raise
+                else:
+                    owner.on_success(response, estimate)
+                    return response
+            finally:
+                if trial:
+                    # Non-retryable errors and cancellation don't decide the trial
+                    owner.breaker.end_trial()
+            time.sleep(delay)
+
+    async def _create_async(self, **kwargs):
+        owner = self._owner
+        for attempt in range(owner.max_retries + 1):
+            trial = owner.breaker.before_call()
+            try:
+                estimate, wait = owner.reserve(kwargs)
+                if wait:
+                    await asyncio.sleep(wait)
+                try:
+                    response = await self._completions.create(**kwargs)
+                except Exception as e:
+                    delay = owner.on_error(e, attempt, estimate)
+                    if delay is None:
+                        raise
+                else:
+                    owner.on_success(response, estimate)
+                    return response
+            finally:
+                if trial:
+                    # Non-retryable errors and cancellation don't decide the trial
+                    owner.breaker.end_trial()
+            await asyncio.sleep(delay)
+
+
+class ResilientClient:
+    """
+    Wrap an OpenAI or AsyncOpenAI client with rate limits, retries and a
+    circuit breaker. Everything but chat.completions is passed straight through.
+    """
+
+    def __init__(self, client, requests_per_minute=60, tokens_per_minute=0, max_retries=6,
+                 breaker_failures=5, breaker_reset_seconds=60.0, base_delay=1.0, max_delay=60.0):
+        # We do the retrying; the SDK's own retries would multiply attempts
+        self._client = client.with_options(max_retries=0)
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset_seconds)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.chat = SimpleNamespace(completions=_ResilientCompletions(self._client.chat.completions, self))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def reserve(self, kwargs):
+        """Reserve budget for one request; returns (token estimate, seconds to wait)."""
+        estimate = estimate_tokens(kwargs) if self.tokens else 0
+        wait = self.requests.reserve() if self.requests else 0.0
+        if self.tokens:
+            wait = max(wait, self.tokens.reserve(estimate))
+        return estimate, wait
+
+    def on_success(self, response, estimate):
+        self.breaker.record_success()
+        usage = getattr(response, 'usage', None)
+        if self.tokens and usage is not None and usage.total_tokens < estimate:
+            self.tokens.refund(estimate - usage.total_tokens)
+
+    def on_error(self, error, attempt, estimate):
+        """Seconds to wait before retrying `error`, or None to give up and re-raise."""
+        if self.tokens:
+            self.tokens.refund(estimate)  # failed requests aren't billed
+        if not is_retryable(error):
+            return None
+        self.breaker.record_failure()
+        if attempt >= self.max_retries or self.breaker.retry_in():
+            return None
+
+        # Full jitter, but never sooner than the server asked
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        delay = max(delay, retry_after(error) or 0.0)
+        logging.warning(f"LLM request failed ({type(error).__name__}), retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
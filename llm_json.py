@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Shared decoder for JSON replies from the LLM.
+
+Post and comment prompts ask for JSON. `json_mode()` adds the
+`response_format` that makes the backend return bare JSON when it supports
+it (LLM_JSON_MODE=false turns it off for backends that don't). Replies are
+then read with `decode_json`, which
+
+1. parses the reply as-is;
+2. otherwise scans for the first JSON value embedded in it (code fences,
+   prose before or after) with an incremental decoder;
+3. otherwise runs a cheap local repair pass (smart quotes used as JSON
+   quotes, trailing commas, output truncated by max_tokens) and tries again,
+
+so a reply that is almost JSON is kept instead of paying for another
+completion. Outcomes are counted; `parse_stats()` reports the failure rate.
+"""
+
+import json
+import os
+import re
+import threading
+
+# strict=False accepts raw control characters (newlines) inside strings
+_decoder = json.JSONDecoder(strict=False)
+
+_stats = {'responses': 0, 'parsed': 0, 'extracted': 0, 'repaired': 0, 'failed': 0}
+_stats_lock = threading.Lock()
+
+
+def json_mode():
+    """Extra chat.completions.create arguments that request a bare JSON object."""
+    if os.getenv('LLM_JSON_MODE', 'true').lower() in ('0', 'false', 'no'):
+        return {}
+    return {'response_format': {'type': 'json_object'}}
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats['responses'] += 1
+        _stats[outcome] += 1
+
+
+def parse_stats():
+    """Counts of how replies were decoded, plus the share that couldn't be."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['failure_rate'] = round(stats['failed'] / stats['responses'], 4) if stats['responses'] else 0.0
+    return stats
+
+
+def extract_json(text):
+    """
+    The JSON object or array embedded in `text` (code fences, prose around it).
+
+    Decoding is tried at the first `{`, then the first `[` (the prompts ask
+    for objects). Retrying at later brackets would pick a nested fragment out
+    of a truncated object, which repair_json handles properly.
+    """
+    for start in (text.find('{'), text.find('[')):
+        if start < 0:
+            continue
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            return value
+        except ValueError:
+            continue
+    raise ValueError('no JSON value found')
+
+
+def repair_json(text):
+    """
+    Best-effort fix-up of nearly-valid JSON: turns smart quotes used as JSON
+    quotes into plain ones (smart quotes inside string values are kept),
+    escapes raw newlines inside strings, drops trailing commas and closes
+    strings and brackets left open by a truncated reply.
+    """
+    start = min((i for i in (text.find('{'), text.find('[')) if i >= 0), default=-1)
+    if start < 0:
+        return text
+    text = text[start:]
+
+    out = []
+    stack = []
+    in_string = escaped = False
+    closers = '"'  # what ends the current string; a smart-quoted one may end either way
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char in closers:
+                in_string = False
+                char = '"'
+            elif char == '\n':
+                char = '\\n'
+            elif char == '\t':
+                char = '\\t'
+        elif char in '"“”':
+            in_string = True
+            closers = '"' if char == '"' else '"”'
+            char = '"'
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if not stack:
+                break  # trailing prose / closing fence
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()  # trailing comma
+            stack.pop()
+            out.append(char)
+            if not stack:
+                break
+            continue
+        out.append(char)
+
+    repaired = ''.join(out)
+    if in_string:
+        repaired += '"'
+    # A truncated reply can stop after a key or a comma; drop the dangling part
+    repaired = re.sub(r'(,\s*"[^"]*"\s*(:\s*)?|\s*"[^"]*"\s*:\s*|,\s*)$', '', repaired.rstrip())
+    return repaired + ''.join(reversed(stack))
+
+
+def decode_json(text, required=()):
+    """
+    Decode an LLM reply into a JSON value, repairing it if needed.
+
+    `required` lists keys the decoded object must have. Raises ValueError
+    (json.JSONDecodeError included) when nothing usable can be recovered.
+    """
+    text = (text or '').strip()
+    outcome = 'parsed'
+    try:
+        value = json.loads(text, strict=False)
+    except ValueError:
+        try:
+            value = extract_json(text)
+            outcome = 'extracted'
+        except ValueError:
+            try:
+                value = json.loads(repair_json(text), strict=False)
+                outcome = 'repaired'
+            except ValueError:
+                _count('failed')
+                raise
+
+    missing = [key for key in required if not isinstance(value, dict) or key not in value]
+    if missing:
+        _count('failed')
+        raise ValueError(f"JSON reply is missing {', '.join(missing)}")
+
+    _count(outcome)
+    return value
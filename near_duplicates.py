@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for generated posts (MinHash with LSH banding).
+
+Re-used articles and families of similar articles (dozens of octopus
+species) make the model write the same "three hearts" post again and again.
+Each post is reduced to two MinHash signatures:
+
+- hook: the content words of the title and TLDR, where a repeated angle
+  shows first even when the body is reworded;
+- body: three-word shingles of the content.
+
+A post is a near-duplicate of an indexed one when the estimated Jaccard
+similarity of either view reaches the threshold. Signatures are split into
+bands and every band is a hash bucket, so a lookup compares only the few
+posts sharing a bucket with the new one instead of the whole index.
+
+Signatures use one-permutation hashing: every shingle is hashed once and
+lands in one of NUM_BINS bins, keeping the bin's minimum, so building a
+signature costs one pass over the shingles. Empty bins (short titles)
+borrow the next non-empty bin's value, offset by the distance.
+
+Python's string hash is salted per process, so signatures are only
+comparable within one process; the generator rebuilds its index from
+`posts` at startup.
+"""
+
+import re
+import unicodedata
+from array import array
+
+NUM_BINS = 64
+BIN_BITS = 6  # log2(NUM_BINS)
+VALUE_BITS = 26  # leaves room for the densification offset in 32 bits
+VALUE_MASK = (1 << VALUE_BITS) - 1
+
+# 16 bands of 4 rows: pairs at similarity 0.5 share a bucket ~64% of the
+# time, at 0.6 ~89%, at 0.7 ~99%
+BANDS = 16
+ROWS = NUM_BINS // BANDS
+
+VIEWS = ('hook', 'body')
+
+STOPWORDS = frozenset("""
+    about after all also and any are been before being but can could did does each from had has
+    have her his how into its just more most not now off one only other our out over own same
+    she than that the their them then there these they this those through too very was were
+    what when where which while who why will with would you your
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def words(text):
+    """Lowercased content words of `text`, with plurals folded."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').lower()
+    tokens = []
+    for word in _WORD.findall(text):
+        if word in STOPWORDS or (len(word) < 3 and not word.isdigit()):
+            continue
+        if len(word) > 4 and word.endswith('ies'):
+            word = word[:-3] + 'y'
+        elif len(word) > 4 and word.endswith(('ses', 'xes', 'zes', 'ches', 'shes')):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def hook_shingles(post):
+    return set(words(f"{post.get('title', '')} {post.get('tldr', '')}"))
+
+
+def body_shingles(post, size=3):
+    tokens = words(post.get('content', ''))
+    if len(tokens) < size:
+        return set(tokens)
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def minhash(shingles):
+    """One-permutation MinHash signature of a set of strings, or None if it is empty."""
+    if not shingles:
+        return None
+    bins = [None] * NUM_BINS
+    for shingle in shingles:
+        h = hash(shingle)
+        slot = h & (NUM_BINS - 1)
+        value = (h >> BIN_BITS) & VALUE_MASK
+        if bins[slot] is None or value < bins[slot]:
+            bins[slot] = value
+
+    # Walk backwards twice round the bins so every empty one sees the next filled one
+    signature = array('I', bytes(4 * NUM_BINS))
+    borrowed, distance = None, 0
+    for position in reversed(range(2 * NUM_BINS)):
+        value = bins[position % NUM_BINS]
+        if value is None:
+            distance += 1
+        else:
+            borrowed, distance = value, 0
+        if position < NUM_BINS:
+            signature[position] = borrowed | (distance << VALUE_BITS)
+    return signature
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    if a is None or b is None:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / NUM_BINS
+
+
+def band_keys(view, signature):
+    if signature is None:
+        return []
+    return [hash((view, band, tuple(signature[band * ROWS:(band + 1) * ROWS]))) for band in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH index over the most recent `capacity` posts.
+
+    Keys are post ids (or any hashable placeholder for a post being
+    generated). Lookups and updates cost O(BANDS) bucket operations plus a
+    signature comparison per candidate. Not thread-safe: the generator only
+    touches it from its event loop.
+    """
+
+    def __init__(self, threshold=0.5, capacity=10000):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.signatures = {}  # key -> (hook, body); insertion order is age
+        self.titles = {}
+        self.buckets = {}     # band key -> [keys]
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def signature(self, post):
+        """Signatures of a post dict with title, tldr and content."""
+        return minhash(hook_shingles(post)), minhash(body_shingles(post))
+
+    def query(self, signature, exclude=None):
+        """Most similar indexed post at or above the threshold: (key, similarity, view), or None."""
+        best = None
+        for i, view in enumerate(VIEWS):
+            candidates = set()
+            for band_key in band_keys(view, signature[i]):
+                candidates.update(self.buckets.get(band_key, ()))
+            for key in candidates:
+                if key == exclude:
+                    continue
+                score = similarity(signature[i], self.signatures[key][i])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (key, score, view)
+        return best
+
+    def add(self, key, signature, title=''):
+        """Index a post under `key`, replacing any previous entry and evicting the oldest past capacity."""
+        self.remove(key)
+        self.signatures[key] = signature
+        self.titles[key] = title
+        for view, view_signature in zip(VIEWS, signature):
+            for band_key in band_keys(view, view_signature):
+                self.buckets.setdefault(band_key, []).append(key)
+        while len(self.signatures) > self.capacity:
+            self.remove(next(iter(self.signatures)))
+
+    def remove(self, key):
+        signature = self.signatures.pop(key, None)
+        self.titles.pop(key, None)
+        if signature is None:
+            return
+        for view, view_signature in zip(VIEWS, signature):
+            for band_key in band_keys(view, view_signature):
+                bucket = self.buckets.get(band_key)
+                if bucket is None:
+                    continue
+                if key in bucket:
+                    bucket.remove(key)
+                if not bucket:
+                    del self.buckets[band_key]
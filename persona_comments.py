@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Batched persona comments.
+
+Instead of one chat completion per persona (each resending the same post),
+all selected personas are asked for in one request that answers with
+`{"comments": [{"persona": name, "comment": text}, ...]}`. Entries are
+validated one by one so the caller only has to fall back to a single
+per-persona request for the personas whose entry is missing or unusable.
+
+This module only builds prompts and parses replies; the content generator
+and the scripts each send them with their own client.
+"""
+
+from llm_json import decode_json
+
+# Replies outside these bounds are treated as failed entries
+MIN_COMMENT_LENGTH = 10
+MAX_COMMENT_LENGTH = 1200
+
+# Completion budget per persona in a batched request
+TOKENS_PER_COMMENT = 200
+
+
+def batch_comment_messages(title, content, personas, length='2-4 sentences', site='a Wikipedia social feed'):
+    """Chat messages asking every persona in `personas` for one comment on a post."""
+    roster = '\n'.join(f"- {persona['name']}: {persona['style']}" for persona in personas)
+
+    system_prompt = (f"You write comments for several different commenters on {site}. "
+                     "Each commenter keeps their own voice and never mentions the others.")
+
+    user_prompt = f"""Post title: {title}
+Post content: {content[:500]}
+
+Commenters:
+{roster}
+
+Write one comment ({length}) from each commenter responding to this post. Stay in character.
+Be conversational, natural, like real Reddit comments. No hashtags. No emojis (maybe 1 max).
+
+Respond with JSON only:
+{{"comments": [{{"persona": "commenter name", "comment": "comment text"}}]}}"""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def batch_max_tokens(personas):
+    """Completion budget for a batched request covering `personas`."""
+    return TOKENS_PER_COMMENT * len(personas) + 100
+
+
+def parse_comment_batch(response_text, personas):
+    """
+    Map persona name -> comment for every valid entry in a batched reply.
+
+    Unknown personas, duplicates, non-string and empty or oversized comments
+    are dropped, so the missing names are exactly the ones to retry singly.
+    A reply that isn't JSON at all yields an empty dict.
+    """
+    try:
+        data = decode_json(response_text)
+    except ValueError:
+        return {}
+
+    entries = data.get('comments', []) if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return {}
+
+    wanted = {persona['name'] for persona in personas}
+    comments = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        name = entry.get('persona')
+        comment = entry.get('comment')
+        if name not in wanted or name in comments or not isinstance(comment, str):
+            continue
+        comment = comment.strip()
+        if MIN_COMMENT_LENGTH <= len(comment) <= MAX_COMMENT_LENGTH:
+            comments[name] = comment
+    return comments
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Precompiled article store built once from the Wikipedia dump.
+
+The `extract` stage converts the dump into sharded files of small
+zlib-compressed blocks plus two fixed-width indexes (by page id and by
+title hash). Readers memory-map the indexes and shards, so fetching one
+article is a binary search, one slice and one small decompress instead of
+another pass over the 24GB dump.
+
+Usage:
+    python3 scripts/article_store.py extract --dump enwiki-...-multistream.xml.bz2 --out data/article_store
+    python3 scripts/article_store.py get --store data/article_store "Octopus"
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import zlib
+from array import array
+
+from wiki_dump import Page, iter_dump_pages, open_dump, parse_pages, read_stream
+
+FORMAT_VERSION = 1
+
+# Target uncompressed size of one block; a block always holds at least one article
+BLOCK_SIZE = 64 * 1024
+SHARD_SIZE = 1024 * 1024 * 1024
+
+# page_id, shard, block offset, block length, slot within block
+ID_RECORD = struct.Struct('<QHQIH')
+# title hash, page_id
+TITLE_RECORD = struct.Struct('<QQ')
+
+META_FILE = 'meta.json'
+ID_INDEX_FILE = 'ids.idx'
+TITLE_INDEX_FILE = 'titles.idx'
+
+
+def normalize_title(title):
+    """Normalize a title the way MediaWiki does (underscores, first letter case)."""
+    title = title.replace('_', ' ').strip()
+    return title[:1].upper() + title[1:]
+
+
+def title_hash(title):
+    """Stable 64-bit hash of a normalized title."""
+    digest = hashlib.blake2b(normalize_title(title).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def shard_name(shard):
+    return f'shard-{shard:04d}.dat'
+
+
+def build_blocks(pages):
+    """Pack pages into compressed blocks of roughly BLOCK_SIZE bytes each."""
+    blocks = []
+    batch = []
+    size = 0
+
+    def flush():
+        data = zlib.compress(json.dumps(batch, ensure_ascii=False).encode('utf-8'), 6)
+        blocks.append((data, [(page_id, title) for page_id, _, title, _ in batch]))
+
+    for page in pages:
+        batch.append(list(page))
+        size += len(page.text) + len(page.title)
+        if size >= BLOCK_SIZE:
+            flush()
+            batch = []
+            size = 0
+
+    if batch:
+        flush()
+    return blocks
+
+
+# Per-process state for parallel extraction (set by _init_worker)
+_worker_file = None
+
+
+def _init_worker(dump_path):
+    global _worker_file
+    _worker_file = open(dump_path, 'rb')
+
+
+def _compress_stream(offset):
+    """Decompress one dump stream and recompress its articles as store blocks."""
+    return build_blocks(parse_pages(read_stream(_worker_file, offset)))
+
+
+def iter_blocks(dump_path, workers=None):
+    """Yield compressed blocks for every article in the dump, in dump order."""
+    dump = open_dump(dump_path)
+    if dump is None:
+        pending = []
+        for page in iter_dump_pages(dump_path):
+            pending.append(page)
+            if len(pending) >= 100:
+                yield from build_blocks(pending)
+                pending = []
+        yield from build_blocks(pending)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with multiprocessing.Pool(workers, _init_worker, (dump.dump_path,)) as pool:
+        for blocks in pool.imap(_compress_stream, dump.index.offsets, chunksize=16):
+            yield from blocks
+
+
+def extract(dump_path, out_dir, workers=None):
+    """Convert a dump into a sharded, block-compressed article store."""
+    os.makedirs(out_dir, exist_ok=True)
+
+    ids = array('Q')
+    shards = array('H')
+    offsets = array('Q')
+    lengths = array('I')
+    slots = array('H')
+    hashes = array('Q')
+
+    next_report = 100000
+    shard = 0
+    shard_file = open(os.path.join(out_dir, shard_name(shard)), 'wb')
+
+    try:
+        for data, entries in iter_blocks(dump_path, workers):
+            if shard_file.tell() + len(data) > SHARD_SIZE and shard_file.tell() > 0:
+                shard_file.close()
+                shard += 1
+                shard_file = open(os.path.join(out_dir, shard_name(shard)), 'wb')
+
+            offset = shard_file.tell()
+            shard_file.write(data)
+
+            for slot, (page_id, title) in enumerate(entries):
+                ids.append(page_id)
+                shards.append(shard)
+                offsets.append(offset)
+                lengths.append(len(data))
+                slots.append(slot)
+                hashes.append(title_hash(title))
+
+            if len(ids) >= next_report:
+                print(f"   {len(ids)} articles stored...")
+                next_report += 100000
+    finally:
+        shard_file.close()
+
+    # Dumps are ordered by page id already, but don't rely on it
+    by_id = sorted(range(len(ids)), key=ids.__getitem__)
+    with open(os.path.join(out_dir, ID_INDEX_FILE), 'wb') as f:
+        for i in by_id:
+            f.write(ID_RECORD.pack(ids[i], shards[i], offsets[i], lengths[i], slots[i]))
+
+    by_title = sorted(range(len(ids)), key=lambda i: (hashes[i], ids[i]))
+    with open(os.path.join(out_dir, TITLE_INDEX_FILE), 'wb') as f:
+        for i in by_title:
+            f.write(TITLE_RECORD.pack(hashes[i], ids[i]))
+
+    with open(os.path.join(out_dir, META_FILE), 'w') as f:
+        json.dump({
+            'version': FORMAT_VERSION,
+            'source': os.path.basename(dump_path),
+            'articles': len(ids),
+            'shards': shard + 1
+        }, f, indent=2)
+
+    return len(ids)
+
+
+def _map(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ArticleStore:
+    """Read-only, memory-mapped view over an extracted article store."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported article store version: {self.meta.get('version')}")
+
+        self._ids = _map(os.path.join(path, ID_INDEX_FILE))
+        self._titles = _map(os.path.join(path, TITLE_INDEX_FILE))
+        self._shards = [_map(os.path.join(path, shard_name(i))) for i in range(self.meta['shards'])]
+        self._count = len(self._ids) // ID_RECORD.size
+
+    def __len__(self):
+        return self._count
+
+    def _id_record(self, i):
+        return ID_RECORD.unpack_from(self._ids, i * ID_RECORD.size)
+
+    def _read_block(self, shard, offset, length):
+        data = zlib.decompress(self._shards[shard][offset:offset + length])
+        return json.loads(data)
+
+    def _load(self, record):
+        _, shard, offset, length, slot = record
+        return Page(*self._read_block(shard, offset, length)[slot])
+
+    def get(self, page_id):
+        """Fetch one article by page id, or None."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id_record(mid)[0] < page_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            record = self._id_record(lo)
+            if record[0] == page_id:
+                return self._load(record)
+        return None
+
+    def get_by_title(self, title):
+        """Fetch one article by title, or None."""
+        key = title_hash(title)
+        count = len(self._titles) // TITLE_RECORD.size
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if TITLE_RECORD.unpack_from(self._titles, mid * TITLE_RECORD.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        wanted = normalize_title(title)
+        # Walk every entry sharing the hash in case of a collision
+        while lo < count:
+            found_hash, page_id = TITLE_RECORD.unpack_from(self._titles, lo * TITLE_RECORD.size)
+            if found_hash != key:
+                break
+            page = self.get(page_id)
+            if page and normalize_title(page.title) == wanted:
+                return page
+            lo += 1
+        return None
+
+    def sample(self, count, rng=None):
+        """Fetch `count` articles chosen uniformly at random."""
+        rng = rng or random
+        slots = rng.sample(range(self._count), min(count, self._count))
+        return [self._load(self._id_record(i)) for i in slots]
+
+    def __iter__(self):
+        """Yield every article in page id order, decompressing each block once."""
+        cached_key = None
+        block = None
+        for i in range(self._count):
+            _, shard, offset, length, slot = self._id_record(i)
+            if (shard, offset) != cached_key:
+                block = self._read_block(shard, offset, length)
+                cached_key = (shard, offset)
+            yield Page(*block[slot])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the precompiled article store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = subparsers.add_parser('extract', help='Convert a dump into an article store')
+    extract_parser.add_argument('--dump', required=True, help='Wikipedia .xml.bz2 dump')
+    extract_parser.add_argument('--out', default='data/article_store', help='Output directory')
+    extract_parser.add_argument('--workers', type=int, default=None,
+                                help='Worker processes (default: one per core)')
+
+    get_parser = subparsers.add_parser('get', help='Print one article by title or page id')
+    get_parser.add_argument('--store', default='data/article_store', help='Article store directory')
+    get_parser.add_argument('key', help='Article title, or page id with --id')
+    get_parser.add_argument('--id', action='store_true', help='Treat key as a page id')
+
+    args = parser.parse_args()
+
+    if args.command == 'extract':
+        if not os.path.exists(args.dump):
+            print(f"❌ File not found: {args.dump}")
+            sys.exit(1)
+        print(f"📖 Extracting {args.dump} -> {args.out}")
+        count = extract(args.dump, args.out, args.workers)
+        print(f"✅ Stored {count} articles in {args.out}")
+    else:
+        store = ArticleStore(args.store)
+        page = store.get(int(args.key)) if args.id else store.get_by_title(args.key)
+        if not page:
+            print(f"❌ Not found: {args.key}")
+            sys.exit(1)
+        print(f"{page.title} (id {page.id})\n")
+        print(page.text)
+
+
+if __name__ == '__main__':
+    main()
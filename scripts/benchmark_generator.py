@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for the content generator.
+
+Drives WikiPostGenerator against the local mock LLM server
+(scripts/mock_llm_server.py) and a local Postgres database, and reports
+posts/sec, p50/p99 per-article latency (post plus comments) and time spent
+in the database for each pipeline mode:
+
+    sequential  one LLM request at a time, one request per comment
+    async       concurrent requests, one request per comment
+    batched     concurrent requests, all of a post's comments in one request
+
+Synthetic "Benchmark article N" rows are seeded before each mode and
+removed afterwards along with their posts and comments. Use a scratch
+database (--db-name, default wikifeedia_bench); the schema is created if it
+is missing.
+
+Usage:
+    python3 scripts/benchmark_generator.py --posts 50 --latency 0.3
+    python3 scripts/benchmark_generator.py --modes batched --min-posts-per-sec 5   # regression gate
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+
+# Shared modules live at the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mock_llm_server
+
+MODES = {
+    'sequential': {'llm_concurrency': 1, 'batch_comments': False},
+    'async': {'batch_comments': False},
+    'batched': {'batch_comments': True},
+}
+
+TITLE_PREFIX = 'Benchmark article'
+
+FILLER = ("The benchmark article describes a place, a person and an event in enough "
+          "detail to look like a real lead section. ") * 30
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def ensure_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('wiki_articles')")
+    if cursor.fetchone()[0] is None:
+        with open(os.path.join(ROOT, 'database', 'schema.sql'), 'r') as f:
+            cursor.execute(f.read())
+        conn.commit()
+    cursor.close()
+
+
+def clear_benchmark_rows(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        DELETE FROM posts WHERE source_article_id IN
+            (SELECT id FROM wiki_articles WHERE title LIKE %s)
+    """, (TITLE_PREFIX + ' %',))
+    cursor.execute("DELETE FROM wiki_articles WHERE title LIKE %s", (TITLE_PREFIX + ' %',))
+    conn.commit()
+    cursor.close()
+
+
+def seed_articles(conn, count):
+    from psycopg2.extras import execute_values
+
+    clear_benchmark_rows(conn)
+    cursor = conn.cursor()
+    execute_values(cursor, """
+        INSERT INTO wiki_articles (title, content, url, categories, images, quality_score)
+        VALUES %s
+    """, [(f"{TITLE_PREFIX} {i}", FILLER, f"https://example.org/{i}", ['Benchmark'], [], 8.0)
+          for i in range(count)])
+    conn.commit()
+    cursor.close()
+
+
+def make_generator_class():
+    from content_generator import WikiPostGenerator
+
+    class BenchmarkGenerator(WikiPostGenerator):
+        """WikiPostGenerator that records per-article latency and DB time."""
+
+        def __init__(self):
+            super().__init__()
+            self.latencies = []
+            self.db_seconds = 0.0
+
+        async def db(self, method, *args):
+            def timed(*call_args):
+                started = time.perf_counter()
+                try:
+                    return method(*call_args)
+                finally:
+                    self.db_seconds += time.perf_counter() - started
+            return await super().db(timed, *args)
+
+        async def process_article(self, article):
+            started = time.perf_counter()
+            try:
+                return await super().process_article(article)
+            finally:
+                self.latencies.append(time.perf_counter() - started)
+
+    return BenchmarkGenerator
+
+
+async def run_mode(generator_class, mode, posts, batch_size, concurrency):
+    generator = generator_class()
+    generator.generator_config.update({'batch_size': batch_size, 'llm_concurrency': concurrency})
+    generator.generator_config.update(MODES[mode])
+
+    started = time.perf_counter()
+    generated = 0
+    for _ in range(math.ceil(posts / batch_size)):
+        generated += await generator.generate_post_batch()
+    elapsed = time.perf_counter() - started
+    generator.pool.close()
+
+    return {
+        'mode': mode,
+        'posts': generated,
+        'seconds': round(elapsed, 3),
+        'posts_per_sec': round(generated / elapsed, 3) if elapsed else 0.0,
+        'p50_latency': round(percentile(generator.latencies, 0.5), 3),
+        'p99_latency': round(percentile(generator.latencies, 0.99), 3),
+        'db_seconds': round(generator.db_seconds, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the content generator against a mock LLM')
+    parser.add_argument('--posts', type=int, default=50, help='Articles to process per mode')
+    parser.add_argument('--batch-size', type=int, default=10, help='Articles claimed per batch')
+    parser.add_argument('--concurrency', type=int, default=8, help='LLM requests in flight (async modes)')
+    parser.add_argument('--modes', default='sequential,async,batched', help='Comma-separated modes to run')
+    parser.add_argument('--db-name', default='wikifeedia_bench', help='Scratch database to use')
+    parser.add_argument('--base-url', help='Use an already running mock server instead of starting one')
+    parser.add_argument('--min-posts-per-sec', type=float, default=None,
+                        help='Exit non-zero if any mode is slower than this')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    mock_llm_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    modes = [m for m in args.modes.split(',') if m]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        print(f"❌ Unknown mode(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = mock_llm_server.start_server(mock_llm_server.config_from_args(args))
+
+    # Point the generator at the mock, with no cache or client-side rate limit in the way
+    os.environ['LLM_BACKENDS'] = 'deepseek'
+    os.environ['LLM_BASE_URL'] = base_url
+    os.environ['LLM_CACHE'] = 'off'
+    os.environ['LLM_REQUESTS_PER_MINUTE'] = '0'
+    os.environ['LLM_TOKENS_PER_MINUTE'] = '0'
+    os.environ['DB_NAME'] = args.db_name
+    # Every synthetic post is a near-duplicate of the others by design
+    os.environ['NEAR_DUPLICATE_THRESHOLD'] = '0'
+    os.environ.setdefault('DEEPSEEK_API_KEY', 'mock')
+
+    generator_class = make_generator_class()
+    setup = generator_class()
+    with setup.pool.connection() as conn:
+        ensure_schema(conn)
+
+    results = []
+    try:
+        for mode in modes:
+            with setup.pool.connection() as conn:
+                seed_articles(conn, args.posts)
+            if not args.json:
+                print(f"⏱️  {mode}: {args.posts} articles, batches of {args.batch_size}...")
+            results.append(asyncio.run(run_mode(generator_class, mode, args.posts,
+                                                args.batch_size, args.concurrency)))
+    finally:
+        with setup.pool.connection() as conn:
+            clear_benchmark_rows(conn)
+        setup.pool.close()
+        if server:
+            server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"\n{'mode':<12}{'posts':>7}{'posts/s':>10}{'p50 s':>9}{'p99 s':>9}{'db s':>8}")
+        for r in results:
+            print(f"{r['mode']:<12}{r['posts']:>7}{r['posts_per_sec']:>10.2f}"
+                  f"{r['p50_latency']:>9.2f}{r['p99_latency']:>9.2f}{r['db_seconds']:>8.2f}")
+
+    if args.min_posts_per_sec is not None:
+        slow = [r for r in results if r['posts_per_sec'] < args.min_posts_per_sec]
+        if slow:
+            print(f"\n❌ Below {args.min_posts_per_sec} posts/sec: {', '.join(r['mode'] for r in slow)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,17 +4,23 @@ Generate posts from ACTUAL Wikipedia articles in the dump.
 This reads from the real 24GB dump file.
 """
 
-import bz2
-import re
+import argparse
 import random
-import json
 import os
-import xml.etree.ElementTree as ET
-from openai import OpenAI
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import sys
 
+# Shared modules live at the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_backends import make_client
+from llm_json import decode_json, json_mode
+from supabase_writer import BufferedWriter
+
+from article_store import ArticleStore
+from wikitext import extract_features
+from wiki_dump import SAMPLE_WEIGHTS, iter_dump_pages, iter_pages_parallel, open_dump, sample_dump
+
 load_dotenv()
 
 # Initialize clients
@@ -27,57 +33,87 @@ if not supabase_url or not supabase_key or not deepseek_key:
     sys.exit(1)
 
 supabase: Client = create_client(supabase_url, supabase_key)
-ai_client = OpenAI(api_key=deepseek_key, base_url="https://api.deepseek.com/v1")
+ai_client = make_client(deepseek_key)
+
+# Non-article namespaces (Category:, Template:, File:, ...) are filtered by the parser
+SKIP_WORDS = ['List of', 'disambiguation']
+
+def page_to_article(title, text):
+    """Turn a raw dump page into an article dict, or None if it isn't interesting."""
+    if not title or not text or len(text) <= 300:
+        return None
+    # Skip disambiguation and lists
+    if any(word in title for word in SKIP_WORDS):
+        return None
+    # Plain-text lead section (before the first == heading)
+    intro = extract_features(text)['lead'][:800]
+    if len(intro) <= 100:
+        return None
+    return {'title': title, 'content': intro}
+
+def article_from_page(page):
+    """Pool-friendly wrapper around page_to_article."""
+    return page_to_article(page.title, page.text)
+
+def extract_articles_parallel(dump, max_articles=200, workers=None):
+    """Decompress and parse the dump's streams across a process pool."""
+    articles = []
+    
+    print(f"📖 Reading {len(dump.index)} streams with {workers or os.cpu_count()} workers: {dump.dump_path}")
+    
+    for article in iter_pages_parallel(dump, article_from_page, workers):
+        articles.append(article)
+        if len(articles) % 10000 == 0:
+            print(f"   Found {len(articles)} articles...")
+        if max_articles and len(articles) >= max_articles:
+            break
+    
+    print(f"✅ Extracted {len(articles)} articles\n")
+    return articles
+
+def sample_articles_from_dump(dump, count, rng=None):
+    """Sample articles from random streams of a multistream dump."""
+    print(f"🎯 Sampling {count} articles from {len(dump.index)} streams: {dump.dump_path}")
+    pages = dump.sample_pages(
+        count,
+        predicate=article_from_page,
+        rng=rng
+    )
+    articles = [page_to_article(page.title, page.text) for page in pages]
+    print(f"✅ Sampled {len(articles)} articles\n")
+    return articles
+
+def sample_articles_from_store(store, count, rng=None, max_attempts=20):
+    """Sample articles from a precompiled article store."""
+    rng = rng or random
+    print(f"🎯 Sampling {count} articles from {len(store)} stored articles: {store.path}")
+    articles = []
+    for _ in range(max_attempts):
+        for page in store.sample(count - len(articles), rng):
+            article = article_from_page(page)
+            if article:
+                articles.append(article)
+        if len(articles) >= count:
+            break
+    print(f"✅ Sampled {len(articles)} articles\n")
+    return articles
 
 def extract_articles_from_dump(dump_file, max_articles=200):
     """Extract articles from Wikipedia dump."""
     articles = []
-    current_title = None
-    current_text = None
-    in_text = False
     
     print(f"📖 Reading: {dump_file}")
     
-    with bz2.open(dump_file, 'rt', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            # Extract title
-            if '<title>' in line:
-                match = re.search(r'<title>(.*?)</title>', line)
-                if match:
-                    current_title = match.group(1)
-            
-            # Extract text
-            if '<text' in line and current_title:
-                in_text = True
-                current_text = ""
-            
-            if in_text:
-                # Accumulate text until </text>
-                if '</text>' in line:
-                    # Process article
-                    if current_title and current_text and len(current_text) > 300:
-                        # Skip disambiguation and lists
-                        skip_words = ['List of', 'Category:', 'Template:', 'File:', 'disambiguation']
-                        if not any(word in current_title for word in skip_words):
-                            # Extract first paragraph (before ==)
-                            intro = re.split(r'==', current_text)[0].strip()[:800]
-                            if len(intro) > 100:
-                                articles.append({
-                                    'title': current_title,
-                                    'content': intro
-                                })
-                                if len(articles) % 10 == 0:
-                                    print(f"   Found {len(articles)} articles...")
-                    
-                    in_text = False
-                    current_title = None
-                    current_text = None
-                else:
-                    current_text += line
-            
-            # Stop after enough articles
-            if len(articles) >= max_articles:
-                break
+    for page in iter_dump_pages(dump_file):
+        article = page_to_article(page.title, page.text)
+        if article:
+            articles.append(article)
+            if len(articles) % 10 == 0:
+                print(f"   Found {len(articles)} articles...")
+        
+        # Stop after enough articles
+        if len(articles) >= max_articles:
+            break
     
     print(f"✅ Extracted {len(articles)} articles\n")
     return articles
@@ -105,63 +141,90 @@ Return JSON only:
     
     try:
         response = ai_client.chat.completions.create(
-            model="deepseek-chat",
+            task='post',
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=0.8,
-            max_tokens=1500
+            max_tokens=1500,
+            **json_mode()
         )
         
-        content = response.choices[0].message.content.strip()
-        
-        if "```" in content:
-            content = content.split("```")[1].split("```")[0]
-            if "json" in content:
-                content = content.split("json")[1]
-        content = content.strip()
-        
-        return json.loads(content)
+        return decode_json(response.choices[0].message.content, required=('title', 'content', 'category'))
     except Exception as e:
         print(f"   ❌ AI error: {e}")
         return None
 
 def main():
+    parser = argparse.ArgumentParser(description='Generate posts from the Wikipedia dump')
+    parser.add_argument('--dump', default='enwiki-20251001-pages-articles-multistream.xml.bz2',
+                        help='Multistream dump file')
+    parser.add_argument('--full', action='store_true',
+                        help='Scan the dump in parallel instead of seeking to random blocks')
+    parser.add_argument('--max-articles', type=int, default=200,
+                        help='Articles to collect with --full (0 = whole dump)')
+    parser.add_argument('--store', default=None,
+                        help='Read from a precompiled article store (see article_store.py extract)')
+    parser.add_argument('--reservoir', action='store_true',
+                        help='Sample uniformly from the whole dump in one pass')
+    parser.add_argument('--weight', choices=sorted(SAMPLE_WEIGHTS), default='uniform',
+                        help='Weighting for --reservoir sampling')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed for reproducible samples')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for --full/--reservoir (default: one per core)')
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    
     print("🚀 Generating posts from REAL Wikipedia articles...\n")
     
     # Check for dump file
-    dump_file = 'enwiki-20251001-pages-articles-multistream.xml.bz2'
+    dump_file = args.dump
     
-    if not os.path.exists(dump_file):
+    if not args.store and not os.path.exists(dump_file):
         print(f"❌ File not found: {dump_file}")
         print("   Make sure the Wikipedia dump is in the project root")
         return
     
-    # Extract articles
-    articles = extract_articles_from_dump(dump_file, max_articles=200)
+    # Seek straight to random streams when the multistream index is available,
+    # otherwise fall back to scanning from the start of the dump
+    dump = None if args.store else open_dump(dump_file)
+    if args.store:
+        articles = sample_articles_from_store(ArticleStore(args.store), 10, rng)
+    elif args.reservoir:
+        print(f"🎯 Sampling 10 articles ({args.weight}) from the whole dump: {dump_file}")
+        articles = sample_dump(dump_file, 10, article_from_page, SAMPLE_WEIGHTS[args.weight],
+                               args.seed, args.workers)
+    elif dump and args.full:
+        articles = extract_articles_parallel(dump, args.max_articles, args.workers)
+    elif dump:
+        articles = sample_articles_from_dump(dump, 10, rng)
+    else:
+        articles = extract_articles_from_dump(dump_file, max_articles=200)
     
     if len(articles) < 10:
         print("❌ Not enough articles found!")
         return
     
     # Randomly select 10 unique articles
-    selected = random.sample(articles, 10)
+    selected = rng.sample(articles, 10)
     
     print(f"🎲 Creating 10 posts from Wikipedia articles...\n")
     
-    created = 0
-    for i, article in enumerate(selected):
-        print(f"[{i+1}/10] {article['title']}")
+    # Posts are written in bulk; leaving the block flushes whatever is still buffered
+    with BufferedWriter(supabase) as writer:
+        for i, article in enumerate(selected):
+            print(f"[{i+1}/10] {article['title']}")
         
-        post = generate_post_from_article(article['title'], article['content'])
+            post = generate_post_from_article(article['title'], article['content'])
         
-        if not post:
-            print("   ❌ Failed to generate post")
-            continue
+            if not post:
+                print("   ❌ Failed to generate post")
+                continue
         
-        try:
-            result = supabase.table('posts').insert({
+            # Queue for a bulk insert; full chunks are written in the background
+            writer.add_post({
                 'title': post['title'],
                 'content': post['content'],
                 'category': post.get('category', 'Science'),
@@ -170,17 +233,11 @@ def main():
                 'tldr': post.get('tldr', ''),
                 'upvotes': 0,
                 'views': 0
-            }).execute()
-            
-            if result.data:
-                print(f"   ✅ Created: {post['title']}")
-                created += 1
-        except Exception as e:
-            print(f"   ❌ Database error: {e}")
-        
-        print()
+            })
+            print(f"   📝 Queued: {post['title']}")
+            print()
     
-    print(f"✨ Created {created} unique posts from Wikipedia!")
+    print(f"✨ Created {writer.posts_written} unique posts from Wikipedia! ({writer.requests} database requests)")
 
 if __name__ == '__main__':
     main()
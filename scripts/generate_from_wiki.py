@@ -4,16 +4,23 @@ Generate posts from the actual Wikipedia dump.
 This script reads from the Wikipedia XML files and creates posts from interesting articles.
 """
 
-import bz2
+import argparse
 import re
-import xml.etree.ElementTree as ET
 import random
-import json
 import os
-from openai import OpenAI
+import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+# Shared modules live at the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_backends import make_client
+from llm_json import decode_json, json_mode
+from supabase_writer import BufferedWriter
+
+from article_store import ArticleStore
+from wiki_dump import SAMPLE_WEIGHTS, iter_dump_pages, iter_pages_parallel, open_dump, sample_dump
+
 load_dotenv()
 
 # Initialize clients
@@ -26,7 +33,68 @@ if not supabase_url or not supabase_key or not deepseek_key:
     sys.exit(1)
 
 supabase: Client = create_client(supabase_url, supabase_key)
-ai_client = OpenAI(api_key=deepseek_key, base_url="https://api.deepseek.com/v1")
+ai_client = make_client(deepseek_key)
+
+# Non-article namespaces (Category:, Template:, File:, ...) are filtered by the parser
+SKIP_WORDS = ['List of', 'Disambiguation']
+
+def page_to_article(title_text, text_content):
+    """Turn a raw dump page into an article dict, or None if it isn't interesting."""
+    # Filter for interesting articles (longer content, not stubs)
+    if len(text_content) <= 500 or len(title_text) == 0:
+        return None
+    # Skip disambiguation pages, etc.
+    if any(word in title_text for word in SKIP_WORDS):
+        return None
+    return {
+        'title': title_text,
+        'content': text_content[:2000]  # First 2000 chars
+    }
+
+def article_from_page(page):
+    """Pool-friendly wrapper around page_to_article."""
+    return page_to_article(page.title, page.text)
+
+def parse_wiki_dump_parallel(dump, max_articles=500, workers=None):
+    """Decompress and parse the dump's streams across a process pool."""
+    articles = []
+    
+    print(f"📖 Reading {len(dump.index)} streams with {workers or os.cpu_count()} workers: {dump.dump_path}")
+    
+    for article in iter_pages_parallel(dump, article_from_page, workers):
+        articles.append(article)
+        if max_articles and len(articles) >= max_articles:
+            break
+    
+    print(f"✅ Extracted {len(articles)} articles")
+    return articles
+
+def sample_wiki_dump(dump, count, rng=None):
+    """Sample articles from random streams of a multistream dump."""
+    print(f"🎯 Sampling {count} articles from {len(dump.index)} streams: {dump.dump_path}")
+    pages = dump.sample_pages(
+        count,
+        predicate=article_from_page,
+        rng=rng
+    )
+    articles = [page_to_article(page.title, page.text) for page in pages]
+    print(f"✅ Sampled {len(articles)} articles")
+    return articles
+
+def sample_wiki_store(store, count, rng=None, max_attempts=20):
+    """Sample articles from a precompiled article store."""
+    rng = rng or random
+    print(f"🎯 Sampling {count} articles from {len(store)} stored articles: {store.path}")
+    articles = []
+    for _ in range(max_attempts):
+        for page in store.sample(count - len(articles), rng):
+            article = article_from_page(page)
+            if article:
+                articles.append(article)
+        if len(articles) >= count:
+            break
+    print(f"✅ Sampled {len(articles)} articles")
+    return articles
 
 def parse_wiki_dump(filepath):
     """Parse Wikipedia XML dump and extract articles."""
@@ -34,57 +102,16 @@ def parse_wiki_dump(filepath):
     
     print(f"📖 Reading Wikipedia dump: {filepath}")
     
-    # Check if file is compressed
-    if filepath.endswith('.bz2'):
-        f = bz2.open(filepath, 'rt')
-    else:
-        f = open(filepath, 'r')
-    
-    try:
-        # Read in chunks (Wikipedia dumps can be huge)
-        chunk = ""
-        for line in f:
-            # Look for <page> tags
-            if '<page>' in line:
-                chunk = line
-                continue
-            
-            if chunk:
-                chunk += line
-            
-            if '</page>' in line and chunk:
-                try:
-                    # Parse this page
-                    page_root = ET.fromstring(chunk)
-                    
-                    # Extract title and text
-                    title = page_root.find('.//title')
-                    text = page_root.find('.//text')
-                    
-                    if title is not None and text is not None:
-                        title_text = title.text or ""
-                        text_content = text.text or ""
-                        
-                        # Filter for interesting articles (longer content, not stubs)
-                        if len(text_content) > 500 and len(title_text) > 0:
-                            # Skip disambiguation pages, etc.
-                            if not any(word in title_text for word in ['List of', 'Category:', 'Template:', 'File:', 'Disambiguation']):
-                                articles.append({
-                                    'title': title_text,
-                                    'content': text_content[:2000]  # First 2000 chars
-                                })
-                                print(f"   Found: {title_text}")
-                except ET.ParseError:
-                    pass
-                
-                chunk = ""
-            
-            # Limit to 500 interesting articles to avoid memory issues
-            if len(articles) >= 500:
-                break
-    
-    finally:
-        f.close()
+    # Pages are streamed one at a time (Wikipedia dumps can be huge)
+    for page in iter_dump_pages(filepath):
+        article = page_to_article(page.title, page.text)
+        if article:
+            articles.append(article)
+            print(f"   Found: {article['title']}")
+        
+        # Limit to 500 interesting articles to avoid memory issues
+        if len(articles) >= 500:
+            break
     
     print(f"✅ Extracted {len(articles)} articles")
     return articles
@@ -117,68 +144,99 @@ Format as JSON:
     
     try:
         response = ai_client.chat.completions.create(
-            model="deepseek-chat",
+            task='post',
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=0.8,
-            max_tokens=1500
+            max_tokens=1500,
+            **json_mode()
         )
         
-        content = response.choices[0].message.content.strip()
-        
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        
-        return json.loads(content)
+        return decode_json(response.choices[0].message.content, required=('title', 'content', 'category'))
     except Exception as e:
         print(f"Error generating post: {e}")
         return None
 
-def main():
-    print("🚀 Generating posts from Wikipedia dump...\n")
-    
-    # Find Wikipedia dump files
+def find_dump_file():
+    """Find the Wikipedia dump in the current directory."""
     wiki_files = [f for f in os.listdir('.') if 'enwiki' in f and f.endswith('.bz2')]
     
-    if not wiki_files:
-        print("❌ No Wikipedia dump files found!")
-        print("   Looking for: enwiki-*.bz2")
-        return
+    # Skip the multistream index file that sits next to the dump
+    dump_files = [f for f in wiki_files if 'index' not in f]
+    return dump_files[0] if dump_files else None
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate posts from the Wikipedia dump')
+    parser.add_argument('--full', action='store_true',
+                        help='Scan the dump in parallel instead of seeking to random blocks')
+    parser.add_argument('--max-articles', type=int, default=500,
+                        help='Articles to collect with --full (0 = whole dump)')
+    parser.add_argument('--store', default=None,
+                        help='Read from a precompiled article store (see article_store.py extract)')
+    parser.add_argument('--reservoir', action='store_true',
+                        help='Sample uniformly from the whole dump in one pass')
+    parser.add_argument('--weight', choices=sorted(SAMPLE_WEIGHTS), default='uniform',
+                        help='Weighting for --reservoir sampling')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed for reproducible samples')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for --full/--reservoir (default: one per core)')
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
     
-    # Use the smaller index file first (if available)
-    dump_file = [f for f in wiki_files if 'index' not in f][0]
+    print("🚀 Generating posts from Wikipedia dump...\n")
     
-    print(f"📚 Using: {dump_file}\n")
+    # Randomly select articles to turn into posts
+    num_posts = 10
     
-    # Parse articles
-    articles = parse_wiki_dump(dump_file)
+    if args.store:
+        articles = sample_wiki_store(ArticleStore(args.store), num_posts, rng)
+    else:
+        dump_file = find_dump_file()
+        if not dump_file:
+            print("❌ No Wikipedia dump files found!")
+            print("   Looking for: enwiki-*.bz2")
+            return
+        
+        print(f"📚 Using: {dump_file}\n")
+        
+        # Seek straight to random streams when the multistream index is available
+        dump = open_dump(dump_file)
+        if args.reservoir:
+            print(f"🎯 Sampling {num_posts} articles ({args.weight}) from the whole dump: {dump_file}")
+            articles = sample_dump(dump_file, num_posts, article_from_page, SAMPLE_WEIGHTS[args.weight],
+                                   args.seed, args.workers)
+        elif dump and args.full:
+            articles = parse_wiki_dump_parallel(dump, args.max_articles, args.workers)
+        elif dump:
+            articles = sample_wiki_dump(dump, num_posts, rng)
+        else:
+            articles = parse_wiki_dump(dump_file)
     
     if not articles:
         print("❌ No articles found!")
         return
     
-    # Randomly select articles to turn into posts
-    num_posts = 10
-    selected = random.sample(articles, min(num_posts, len(articles)))
+    selected = rng.sample(articles, min(num_posts, len(articles)))
     
     print(f"\n🎲 Generating {len(selected)} posts...\n")
     
     # Generate posts
-    created = 0
-    for i, article in enumerate(selected):
-        print(f"[{i+1}/{len(selected)}] Processing: {article['title']}")
+    # Posts are written in bulk; leaving the block flushes whatever is still buffered
+    with BufferedWriter(supabase) as writer:
+        for i, article in enumerate(selected):
+            print(f"[{i+1}/{len(selected)}] Processing: {article['title']}")
         
-        post = generate_post_from_wiki(article['title'], article['content'])
+            post = generate_post_from_wiki(article['title'], article['content'])
         
-        if not post:
-            print(f"   ❌ Failed")
-            continue
+            if not post:
+                print(f"   ❌ Failed")
+                continue
         
-        # Insert into database
-        try:
-            result = supabase.table('posts').insert({
+            # Queue for a bulk insert; full chunks are written in the background
+            writer.add_post({
                 'title': post['title'],
                 'content': post['content'],
                 'category': post.get('category', 'Science'),
@@ -187,17 +245,11 @@ def main():
                 'tldr': post.get('tldr', ''),
                 'upvotes': 0,
                 'views': 0
-            }).execute()
-            
-            if result.data:
-                print(f"   ✅ Created: {post['title']}")
-                created += 1
-        except Exception as e:
-            print(f"   ❌ Database error: {e}")
-        
-        print()
+            })
+            print(f"   📝 Queued: {post['title']}")
+            print()
     
-    print(f"✨ Done! Created {created} posts")
+    print(f"✨ Done! Created {writer.posts_written} posts ({writer.requests} database requests)")
 
 if __name__ == '__main__':
     main()
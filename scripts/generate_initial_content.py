@@ -12,11 +12,20 @@ Also maintains a registry to prevent duplicates.
 
 import os
 import json
+import random
 import sys
-from openai import OpenAI
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from article_store import normalize_title
+
+# Shared modules live at the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_backends import make_client
+from llm_json import decode_json, json_mode
+from persona_comments import batch_comment_messages, batch_max_tokens, parse_comment_batch
+from supabase_writer import BufferedWriter
+
 load_dotenv()
 
 # Initialize clients
@@ -30,35 +39,88 @@ if not supabase_url or not supabase_key or not deepseek_key:
     sys.exit(1)
 
 supabase: Client = create_client(supabase_url, supabase_key)
-ai_client = OpenAI(api_key=deepseek_key, base_url="https://api.deepseek.com/v1")
-
-# Registry file to prevent duplicates
-REGISTRY_FILE = 'posted_titles_registry.json'
-
-def load_registry():
-    """Load the registry of already-posted titles."""
-    if os.path.exists(REGISTRY_FILE):
-        with open(REGISTRY_FILE, 'r') as f:
-            return set(json.load(f))
-    return set()
-
-def save_to_registry(title):
-    """Add title to registry."""
-    registry = load_registry()
-    registry.add(title)
-    with open(REGISTRY_FILE, 'w') as f:
-        json.dump(list(registry), f)
-
-def check_if_posted(title):
-    """Check if a title has already been posted."""
-    # Check registry file
-    registry = load_registry()
-    if title in registry:
-        return True
-    
-    # Also check database
-    result = supabase.table('posts').select('title').eq('title', title).execute()
-    return len(result.data) > 0
+ai_client = make_client(deepseek_key)
+
+# Registry of posted source articles: an append-only JSON-lines log, read once per run
+REGISTRY_FILE = 'posted_articles_registry.jsonl'
+# The old registry rewrote a JSON list of AI titles on every post; imported once
+LEGACY_REGISTRY_FILE = 'posted_titles_registry.json'
+
+# Sample articles
+SAMPLE_ARTICLES = [
+    {
+        "title": "Octopus",
+        "content": "Octopuses have three hearts, blue blood, and can edit their own RNA. They are the most intelligent invertebrates. Unlike most animals, octopuses have a decentralized nervous system with two-thirds of neurons located in their arms. Scientists have observed them using tools, solving puzzles, and expressing distinct personalities.",
+    },
+    {
+        "title": "Marie Curie",
+        "content": "Marie Curie was the first woman to win a Nobel Prize and the only person to win in two different sciences. Her research on radioactivity was groundbreaking but ultimately fatal. Her notebooks remain so radioactive they're stored in lead-lined boxes. She died from aplastic anemia caused by radiation exposure.",
+    },
+    {
+        "title": "Operation Acoustic Kitty",
+        "content": "In the 1960s, the CIA spent $20 million on 'Operation Acoustic Kitty' - an attempt to turn cats into mobile surveillance devices. The plan involved surgically implanting listening devices into cats. The project failed when the first test cat immediately wandered away and was hit by a taxi.",
+    },
+    {
+        "title": "Longyearbyen",
+        "content": "Longyearbyen, Norway, is a town where dying has been illegal since 1950. The ground is permanently frozen (permafrost), so bodies don't decompose. A 1918 flu epidemic left corpses still perfectly preserved in ice, complete with intact viruses. Terminally ill residents must leave before death.",
+    },
+    {
+        "title": "Roman Concrete",
+        "content": "Roman concrete gets stronger over time, while modern concrete weakens after 50 years. The Pantheon's unreinforced concrete dome, built in 126 AD, shows no structural problems 2,000 years later. Roman engineers added volcanic ash to their concrete. Scientists are now reverse-engineering this technology.",
+    },
+]
+
+class PostRegistry:
+    """Posted source articles, loaded into memory once and appended to as posts land."""
+
+    def __init__(self, path=REGISTRY_FILE, legacy_path=LEGACY_REGISTRY_FILE):
+        self.path = path
+        self.articles = set()     # source article titles, normalized like the article store
+        self.post_titles = set()  # AI titles, for the legacy entries that only have those
+        if not os.path.exists(path) and os.path.exists(legacy_path):
+            with open(legacy_path, 'r') as f:
+                self._append([{'article': None, 'post': title} for title in json.load(f)])
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self._index(json.loads(line))
+                    except ValueError:
+                        continue  # torn last line from an interrupted run
+
+    def _index(self, entry):
+        if entry.get('article'):
+            self.articles.add(normalize_title(entry['article']))
+        if entry.get('post'):
+            self.post_titles.add(entry['post'])
+
+    def _append(self, entries):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def seen(self, article_title):
+        return normalize_title(article_title) in self.articles
+
+    def add(self, entries):
+        """Record (source article title, post title) pairs."""
+        entries = [{'article': article, 'post': post} for article, post in entries
+                   if not self.seen(article)]
+        for entry in entries:
+            self._index(entry)
+        if entries:
+            self._append(entries)
+
+def posted_titles(titles):
+    """The subset of `titles` already in the posts table, in one request."""
+    if not titles:
+        return set()
+    # Quote every value; PostgREST takes backslash escapes inside quotes
+    quoted = ','.join('"%s"' % title.replace('\\', '\\\\').replace('"', '\\"') for title in titles)
+    result = supabase.table('posts').select('title').filter('title', 'in', f"({quoted})").execute()
+    return {row['title'] for row in result.data}
 
 def generate_post(article):
     """Generate a post using DeepSeek API."""
@@ -88,114 +150,92 @@ Make it punchy, make it interesting, make people want to read it. Think r/todayi
 
     try:
         response = ai_client.chat.completions.create(
-            model="deepseek-chat",
+            task='post',
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=0.8,
-            max_tokens=1500
+            max_tokens=1500,
+            **json_mode()
         )
         
-        response_text = response.choices[0].message.content.strip()
-        
-        # Parse JSON
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        return json.loads(response_text)
+        return decode_json(response.choices[0].message.content, required=('title', 'content', 'category', 'tldr'))
         
     except Exception as e:
         print(f"Error generating post: {e}")
         return None
 
+def generate_single_comment(post_title, post_content, persona):
+    """Generate one bot comment in a specific persona."""
+    system_prompt = f"You are {persona['name']}, a commenter on Wikifeedia. Your style: {persona['style']}"
+    
+    user_prompt = f"""Post: "{post_title}"
+
+{post_content[:500]}
+
+Write a short comment (2-3 sentences) responding to this post. Stay in character. Be conversational. No hashtags."""
+
+    try:
+        response = ai_client.chat.completions.create(
+            task='comment',
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.9,
+            max_tokens=150
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"Error generating comment: {e}")
+        return None
+
 def generate_bot_comments(post_title, post_content, count=4):
-    """Generate AI bot comments to seed discussion."""
-    comments = []
+    """Generate AI bot comments to seed discussion (one request for all personas)."""
     personas = [
         {"name": "ScienceNerd_", "style": "skeptical scientist, asks good questions"},
         {"name": "HistoryBuff1987", "style": "enthusiastic historian, loves to add context"},
         {"name": "CasualLurker", "style": "casual reader, reacts with 'wow' and simple thoughts"},
         {"name": "FunFactBot", "style": "adds related fun facts and connections"},
-    ]
+    ][:count]
     
-    for persona in personas[:count]:
-        system_prompt = f"You are {persona['name']}, a commenter on Wikifeedia. Your style: {persona['style']}"
-        
-        user_prompt = f"""Post: "{post_title}"
-
-{post_content[:500]}
-
-Write a short comment (2-3 sentences) responding to this post. Stay in character. Be conversational. No hashtags."""
-
-        try:
-            response = ai_client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.9,
-                max_tokens=150
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
+    texts = {}
+    try:
+        response = ai_client.chat.completions.create(
+            task='comment',
+            messages=batch_comment_messages(post_title, post_content, personas,
+                                            length='2-3 sentences', site='Wikifeedia'),
+            temperature=0.9,
+            max_tokens=batch_max_tokens(personas),
+            **json_mode()
+        )
+        texts = parse_comment_batch(response.choices[0].message.content, personas)
+    except Exception as e:
+        print(f"Error generating comments: {e}")
+    
+    comments = []
+    for persona in personas:
+        # Fall back to a single request for anything the batch didn't cover
+        content = texts.get(persona['name']) or generate_single_comment(post_title, post_content, persona)
+        if content:
             comments.append({
                 "username": persona['name'],
                 "content": content,
                 "is_ai": True,
                 "upvotes": 0
             })
-            
-        except Exception as e:
-            print(f"Error generating comment: {e}")
     
     return comments
 
-def create_post():
-    """Create a single post with AI comments."""
+def create_post(writer, post):
+    """Add AI comments to a generated post and queue both on `writer`; returns the post's id."""
     
-    # Sample articles
-    sample_articles = [
-        {
-            "title": "Octopus",
-            "content": "Octopuses have three hearts, blue blood, and can edit their own RNA. They are the most intelligent invertebrates. Unlike most animals, octopuses have a decentralized nervous system with two-thirds of neurons located in their arms. Scientists have observed them using tools, solving puzzles, and expressing distinct personalities.",
-        },
-        {
-            "title": "Marie Curie",
-            "content": "Marie Curie was the first woman to win a Nobel Prize and the only person to win in two different sciences. Her research on radioactivity was groundbreaking but ultimately fatal. Her notebooks remain so radioactive they're stored in lead-lined boxes. She died from aplastic anemia caused by radiation exposure.",
-        },
-        {
-            "title": "Operation Acoustic Kitty",
-            "content": "In the 1960s, the CIA spent $20 million on 'Operation Acoustic Kitty' - an attempt to turn cats into mobile surveillance devices. The plan involved surgically implanting listening devices into cats. The project failed when the first test cat immediately wandered away and was hit by a taxi.",
-        },
-        {
-            "title": "Longyearbyen",
-            "content": "Longyearbyen, Norway, is a town where dying has been illegal since 1950. The ground is permanently frozen (permafrost), so bodies don't decompose. A 1918 flu epidemic left corpses still perfectly preserved in ice, complete with intact viruses. Terminally ill residents must leave before death.",
-        },
-        {
-            "title": "Roman Concrete",
-            "content": "Roman concrete gets stronger over time, while modern concrete weakens after 50 years. The Pantheon's unreinforced concrete dome, built in 126 AD, shows no structural problems 2,000 years later. Roman engineers added volcanic ash to their concrete. Scientists are now reverse-engineering this technology.",
-        },
-    ]
-    
-    import random
-    article = random.choice(sample_articles)
-    
-    # Check if already posted
-    post = generate_post(article)
-    if not post:
-        return None
-        
-    if check_if_posted(post['title']):
-        print(f"⏭️  Skipping duplicate: {post['title']}")
-        return None
+    # Generate bot comments
+    bot_comments = generate_bot_comments(post['title'], post['content'], count=4)
     
-    # Insert post
-    post_result = supabase.table('posts').insert({
+    # Queue the post with its comments; the writer inserts both in bulk
+    post_id = writer.add_post({
         'title': post['title'],
         'content': post['content'],
         'category': post['category'],
@@ -204,52 +244,60 @@ def create_post():
         'tldr': post['tldr'],
         'upvotes': 0,
         'views': 0
-    }).execute()
-    
-    if not post_result.data or len(post_result.data) == 0:
-        print(f"❌ Failed to insert post")
-        return None
-    
-    post_id = post_result.data[0]['id']
+    }, [{
+        'username': comment['username'],
+        'content': comment['content'],
+        'is_ai': True,
+        'upvotes': comment['upvotes']
+    } for comment in bot_comments])
     
-    # Generate bot comments
-    bot_comments = generate_bot_comments(post['title'], post['content'], count=4)
+    print(f"📝 Queued: {post['title']} (with {len(bot_comments)} AI comments)")
     
-    # Insert comments
-    for comment in bot_comments:
-        supabase.table('comments').insert({
-            'post_id': post_id,
-            'username': comment['username'],
-            'content': comment['content'],
-            'is_ai': True,
-            'upvotes': comment['upvotes']
-        }).execute()
-    
-    # Save to registry
-    save_to_registry(post['title'])
-    
-    print(f"✅ Created: {post['title']} (with {len(bot_comments)} AI comments)")
-    
-    return post_result.data[0]
+    return post_id
 
 def main():
     print("🚀 Generating initial content for Wikifeedia...\n")
     
+    # Pick up to 10 articles that haven't been posted yet, before clearing anything
+    registry = PostRegistry()
+    articles = [article for article in SAMPLE_ARTICLES if not registry.seen(article['title'])]
+    if not articles:
+        print(f"✨ Every sample article is already posted (see {REGISTRY_FILE})")
+        return
+    articles = random.sample(articles, min(10, len(articles)))
+    
     # First, clear existing posts
     print("🧹 Clearing existing posts...")
     supabase.table('comments').delete().neq('id', '00000000-0000-0000-0000-000000000000').execute()
     supabase.table('posts').delete().neq('id', '00000000-0000-0000-0000-000000000000').execute()
     print("✅ Cleared\n")
     
-    # Generate 10 posts
-    created = 0
-    for i in range(10):
-        print(f"[{i+1}/10] Generating post...")
-        if create_post():
-            created += 1
-        print()
+    drafts = []
+    for i, article in enumerate(articles):
+        print(f"[{i+1}/{len(articles)}] Generating post: {article['title']}")
+        post = generate_post(article)
+        if post:
+            drafts.append((article, post))
+    print()
+    
+    # One database lookup for the whole run
+    existing = posted_titles([post['title'] for _, post in drafts])
+    
+    sources = {}
+    queued = set()
+    with BufferedWriter(supabase) as writer:
+        for article, post in drafts:
+            if post['title'] in queued or post['title'] in existing or post['title'] in registry.post_titles:
+                print(f"⏭️  Skipping duplicate: {post['title']}")
+                continue
+            sources[create_post(writer, post)] = article['title']
+            queued.add(post['title'])
+    
+    # Only register articles whose posts actually landed
+    registry.add([(sources[row['id']], row['title']) for row in writer.written])
     
-    print(f"✨ Done! Created {created} posts")
+    print(f"\n✨ Done! Created {writer.posts_written} posts with {writer.comments_written} comments "
+          f"({writer.requests} database requests)")
     print(f"📊 Registry file: {REGISTRY_FILE}")
 
 if __name__ == '__main__':
@@ -9,136 +9,459 @@ import psycopg2
 import os
 import sys
 import argparse
-import re
+import itertools
+import multiprocessing
+import time
 from pathlib import Path
 
-def extract_image_urls(text):
-    """Extract image URLs from Wikipedia article text."""
-    images = []
-    
-    # Match [[File:filename.jpg|size|description]] patterns
-    pattern = r'\[\[File:([^\]]+)\]\]'
-    matches = re.findall(pattern, text, re.IGNORECASE)
-    
-    for match in matches:
-        # Extract filename (before any |)
-        filename = match.split('|')[0].strip()
-        
-        # Convert to Wikimedia Commons URL
-        # Example: "Octopus_in_natural_habitat.jpg" becomes
-        # "https://upload.wikimedia.org/wikipedia/commons/thumb/3/33/Octopus_in_natural_habitat.jpg/800px-..."
-        
-        # For simplicity, return the filename and let the frontend/API handle URL construction
-        # or we can construct the full URL here
-        if filename and not filename.startswith('http'):
-            images.append(filename)
-    
-    # Limit to first 3 images per article
-    return images[:3]
+from article_store import ArticleStore
+from score_articles import article_features, score_rows
+from wikitext import extract_features
+from wiki_dump import SAMPLE_WEIGHTS, MultistreamDump, default_index_path, iter_pages_parallel, sample_dump
 
 def get_wiki_url(title):
     """Convert article title to Wikipedia URL."""
     title_escaped = title.replace(' ', '_')
     return f"https://en.wikipedia.org/wiki/{title_escaped}"
 
-def import_articles(source_dir, config_path='config.json'):
-    """Import Wikipedia articles from extracted JSON files."""
-    
-    # Load config
+def connect(config_path):
+    """Open a database connection using the settings in config.json."""
     with open(config_path, 'r') as f:
         config = json.load(f)
     
     db_config = config['database']
     
-    # Connect to database
-    conn = psycopg2.connect(
+    return psycopg2.connect(
         host=db_config['host'],
         port=db_config['port'],
         database=db_config['name'],
         user=db_config['user'],
         password=db_config['password']
     )
-    cursor = conn.cursor()
+
+def prepare_article(title, text, page_id=None):
+    """
+    Build `(row, scoring features)` for an article, or None if it should be
+    skipped. score_rows turns the pairs into complete wiki_articles rows.
+    """
+    # Skip disambiguation pages and special pages
+    if 'disambiguation' in title.lower() or title.startswith('Template:'):
+        return None
     
-    # Count files to process
-    json_files = list(Path(source_dir).rglob('*wiki_*'))
-    total_files = len(json_files)
-    print(f"Found {total_files} JSON files to process...")
+    # Skip if article is too short
+    if len(text) < 500:
+        return None
     
-    imported = 0
-    skipped = 0
+    # Images (limited to the first 3 per article) and categories in one call;
+    # the lead isn't stored, so skip cleaning it up
+    features = extract_features(text, lead=False)
     
-    for i, json_file in enumerate(json_files):
-        if i % 100 == 0:
-            print(f"Processing {i}/{total_files} files... ({imported} imported, {skipped} skipped)")
-        
+    row = (page_id, title, text, get_wiki_url(title), features['categories'], features['images'][:3])
+    return row, article_features(text, features)
+
+def insert_article(cursor, row):
+    """Insert a prepared wiki_articles row."""
+    cursor.execute("""
+        INSERT INTO wiki_articles (page_id, title, content, url, categories, images, quality_score)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING
+    """, row)
+
+def insert_rows(conn, rows):
+    """
+    Insert prepared rows in one statement, row by row only if that fails.
+    
+    A failing batch is rolled back to a savepoint and retried one row per
+    savepoint, so a bad row is reported and skipped instead of aborting the
+    transaction. Returns the number of rows actually inserted (rows already
+    in wiki_articles are skipped by ON CONFLICT). The caller commits.
+    """
+    from psycopg2.extras import execute_values
+    
+    if not rows:
+        return 0
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SAVEPOINT batch")
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    article = json.loads(line)
-                    
-                    title = article.get('title', '')
-                    text = article.get('text', '')
-                    url = get_wiki_url(title)
-                    
-                    # Skip disambiguation pages and special pages
-                    if 'disambiguation' in title.lower() or title.startswith('Template:'):
-                        skipped += 1
-                        continue
-                    
-                    # Skip if article is too short
-                    if len(text) < 500:
-                        skipped += 1
-                        continue
-                    
-                    # Extract images
-                    images = extract_image_urls(text)
-                    
-                    # Extract categories (if available in the article)
-                    categories = []
-                    
-                    try:
-                        cursor.execute("""
-                            INSERT INTO wiki_articles (title, content, url, categories, images, quality_score)
-                            VALUES (%s, %s, %s, %s, %s, %s)
-                            ON CONFLICT DO NOTHING
-                        """, (title, text, url, categories, images, 0.0))
-                        
-                        imported += 1
-                        
-                        # Commit every 100 articles
-                        if imported % 100 == 0:
-                            conn.commit()
-                    
-                    except Exception as e:
-                        print(f"Error inserting article '{title}': {e}")
-                        continue
+            execute_values(cursor, """
+                INSERT INTO wiki_articles (page_id, title, content, url, categories, images, quality_score)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, rows, page_size=len(rows))
+            inserted = cursor.rowcount
+            cursor.execute("RELEASE SAVEPOINT batch")
+            return inserted
+        except (psycopg2.DatabaseError, ValueError):
+            cursor.execute("ROLLBACK TO SAVEPOINT batch")
+            cursor.execute("RELEASE SAVEPOINT batch")
+        
+        inserted = 0
+        for row in rows:
+            cursor.execute("SAVEPOINT article")
+            try:
+                insert_article(cursor, row)
+                inserted += cursor.rowcount
+            except (psycopg2.DatabaseError, ValueError) as e:
+                print(f"Error inserting article '{row[1]}': {e}")
+                cursor.execute("ROLLBACK TO SAVEPOINT article")
+            cursor.execute("RELEASE SAVEPOINT article")
+        return inserted
+    finally:
+        cursor.close()
+
+def _copy_text(value):
+    """Escape a value for PostgreSQL's COPY text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (list, tuple)):
+        value = '{' + ','.join(
+            '"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"' for item in value
+        ) + '}'
+    return (str(value).replace('\x00', '')
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+class CopyStream:
+    """File-like object that encodes rows for COPY FROM STDIN as psycopg2 reads it."""
+    
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = bytearray()
+        self.count = 0
+    
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += ('\t'.join(_copy_text(value) for value in row) + '\n').encode('utf-8')
+            self.count += 1
         
-        except Exception as e:
-            print(f"Error processing file {json_file}: {e}")
-            continue
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+    
+    readline = read
+
+def bulk_insert(conn, rows, batch_size=50000, progress=True):
+    """
+    Load rows through COPY into a staging table, then merge them in one statement.
+    
+    Articles whose title or page id is already in wiki_articles are skipped by
+    the set-based merge against the unique keys instead of per-row conflicts.
+    Returns the number of rows actually inserted.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS wiki_articles_staging (
+            page_id INTEGER, title TEXT, content TEXT, url TEXT,
+            categories TEXT[], images TEXT[], quality_score FLOAT
+        )
+    """)
+    
+    rows = iter(rows)
+    inserted = 0
+    while True:
+        stream = CopyStream(itertools.islice(rows, batch_size))
+        cursor.copy_expert("""
+            COPY wiki_articles_staging (page_id, title, content, url, categories, images, quality_score)
+            FROM STDIN
+        """, stream)
+        if stream.count == 0:
+            break
+        
+        cursor.execute("""
+            INSERT INTO wiki_articles (page_id, title, content, url, categories, images, quality_score)
+            SELECT page_id, title, content, url, categories, images, quality_score
+            FROM wiki_articles_staging
+            ON CONFLICT DO NOTHING
+        """)
+        inserted += cursor.rowcount
+        cursor.execute("TRUNCATE wiki_articles_staging")
+        conn.commit()
+        if progress:
+            print(f"   {inserted} imported...")
     
-    conn.commit()
     cursor.close()
+    return inserted
+
+def write_rows(rows, config_path='config.json', bulk=False):
+    """Score prepared articles and write them to wiki_articles, row by row or through COPY with bulk=True."""
+    
+    conn = connect(config_path)
+    started = time.time()
+    rows = score_rows(rows)
+    
+    if bulk:
+        imported = bulk_insert(conn, rows)
+    else:
+        rows = iter(rows)
+        imported = 0
+        while True:
+            # Commit every 100 articles, and only count them once committed
+            batch = list(itertools.islice(rows, 100))
+            if not batch:
+                break
+            inserted = insert_rows(conn, batch)
+            conn.commit()
+            imported += inserted
+            if imported // 100000 > (imported - inserted) // 100000:
+                print(f"   {imported} imported...")
+    
+    conn.commit()
     conn.close()
     
+    elapsed = max(time.time() - started, 1e-9)
     print(f"\n✅ Import complete!")
-    print(f"   Imported: {imported} articles")
+    print(f"   Imported: {imported} articles ({imported / elapsed:.0f} rows/sec)")
+    return imported
+
+def load_manifest(manifest_path):
+    """Read the checkpoint manifest; the last entry for each file wins."""
+    entries = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn write from a crash
+                entries[entry['file']] = entry
+    return entries
+
+def append_manifest(manifest_path, entry):
+    """Append one checkpoint line (small O_APPEND writes don't interleave across workers)."""
+    with open(manifest_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
+
+# Per-process state for parallel file import (set by _init_import_worker)
+_worker_conn = None
+_worker_options = None
+
+def _init_import_worker(config_path, manifest_path, bulk, batch_size):
+    global _worker_conn, _worker_options
+    _worker_conn = connect(config_path)
+    _worker_options = {'manifest': manifest_path, 'bulk': bulk, 'batch_size': batch_size}
+
+def _import_file(task):
+    """Import one extracted file from its last checkpoint, recording progress as it commits."""
+    json_file, rel_path, offset = task
+    conn = _worker_conn
+    manifest_path = _worker_options['manifest']
+    imported = skipped = 0
+    
+    def flush(batch, offset, done):
+        nonlocal imported
+        batch = list(score_rows(batch))
+        if _worker_options['bulk']:
+            inserted = bulk_insert(conn, batch, progress=False)
+        else:
+            # Bad rows are skipped, so the checkpoint can move past them
+            inserted = insert_rows(conn, batch)
+        conn.commit()
+        imported += inserted
+        append_manifest(manifest_path, {'file': rel_path, 'offset': offset, 'done': done})
+    
+    try:
+        with open(json_file, 'rb') as f:
+            f.seek(offset)
+            batch = []
+            for line in f:
+                offset += len(line)
+                try:
+                    article = json.loads(line)
+                    prepared = prepare_article(article.get('title', ''), article.get('text', ''),
+                                          int(article['id']) if article.get('id') else None)
+                except (ValueError, TypeError, AttributeError) as e:
+                    # Skip it like a bad row, so the checkpoint can move past it
+                    print(f"Skipping malformed line in {rel_path} at byte {offset - len(line)}: {e}")
+                    skipped += 1
+                    continue
+                if prepared is None:
+                    skipped += 1
+                    continue
+                
+                batch.append(prepared)
+                if len(batch) >= _worker_options['batch_size']:
+                    flush(batch, offset, False)
+                    batch = []
+            
+            flush(batch, offset, True)
+    
+    except Exception as e:
+        conn.rollback()
+        print(f"Error processing file {json_file}: {e}")
+    
+    return imported, skipped
+
+def import_articles(source_dir, config_path='config.json', bulk=False, workers=None,
+                    manifest_path=None, restart=False, batch_size=1000):
+    """
+    Import Wikipedia articles from extracted JSON files with a pool of workers.
+    
+    Each worker has its own connection and appends `{file, offset, done}`
+    checkpoints to the manifest after every commit, so a restarted import
+    skips finished files and resumes partial ones from their byte offset.
+    
+    WikiExtractor has already stripped the wikitext markup from these files,
+    so articles imported this way have no categories or images; import from
+    the dump or an article store to get them.
+    """
+    
+    manifest_path = manifest_path or os.path.join(source_dir, '.import_manifest.jsonl')
+    if restart and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    checkpoints = load_manifest(manifest_path)
+    
+    # Count files to process
+    json_files = sorted(Path(source_dir).rglob('*wiki_*'))
+    tasks = []
+    for json_file in json_files:
+        rel_path = str(json_file.relative_to(source_dir))
+        checkpoint = checkpoints.get(rel_path, {})
+        if not checkpoint.get('done'):
+            tasks.append((str(json_file), rel_path, checkpoint.get('offset', 0)))
+    
+    total_files = len(tasks)
+    workers = workers or os.cpu_count() or 1
+    print(f"Found {len(json_files)} JSON files, {total_files} left to process with {workers} workers...")
+    
+    imported = 0
+    skipped = 0
+    started = time.time()
+    
+    with multiprocessing.Pool(workers, _init_import_worker,
+                              (config_path, manifest_path, bulk, batch_size)) as pool:
+        for i, (file_imported, file_skipped) in enumerate(pool.imap_unordered(_import_file, tasks)):
+            imported += file_imported
+            skipped += file_skipped
+            if i % 100 == 0:
+                print(f"Processing {i}/{total_files} files... ({imported} imported, {skipped} skipped)")
+    
+    elapsed = max(time.time() - started, 1e-9)
+    print(f"\n✅ Import complete!")
+    print(f"   Imported: {imported} articles ({imported / elapsed:.0f} rows/sec)")
     print(f"   Skipped: {skipped} articles")
 
+def row_from_page(page):
+    """Pool-friendly wrapper around prepare_article."""
+    return prepare_article(page.title, page.text, page.id)
+
+def import_dump_sample(dump_path, sample_size, config_path='config.json', index_path=None, bulk=False):
+    """Import a random sample of articles straight from a multistream dump."""
+    
+    dump = MultistreamDump(dump_path, index_path)
+    print(f"Loaded index with {len(dump.index)} streams, sampling {sample_size} articles...")
+    
+    pages = dump.sample_pages(
+        sample_size,
+        predicate=lambda page: row_from_page(page) is not None
+    )
+    write_rows((row_from_page(page) for page in pages), config_path, bulk)
+
+def import_store(store_path, config_path='config.json', sample_size=None, bulk=False):
+    """Import articles from a precompiled article store (all of them, or a random sample)."""
+    
+    store = ArticleStore(store_path)
+    pages = store.sample(sample_size) if sample_size else store
+    print(f"Importing {sample_size or len(store)} of {len(store)} stored articles from {store_path}...")
+    
+    prepared = (row_from_page(page) for page in pages)
+    write_rows((article for article in prepared if article is not None), config_path, bulk)
+
+def import_dump_full(dump_path, config_path='config.json', index_path=None, workers=None, bulk=False):
+    """Import every article in a multistream dump, decoding streams in parallel."""
+    
+    dump = MultistreamDump(dump_path, index_path)
+    print(f"Importing {len(dump.index)} streams with {workers or os.cpu_count()} workers...")
+    
+    write_rows(iter_pages_parallel(dump, row_from_page, workers), config_path, bulk)
+
+def import_dump_reservoir(dump_path, sample_size, config_path='config.json', index_path=None,
+                          weight='uniform', seed=None, workers=None, bulk=False):
+    """
+    Refill the candidate pool with a sample drawn from the whole dump in one pass.
+    
+    Safe to run on a schedule: the sample is held in O(sample_size) memory and
+    articles already in wiki_articles are left alone.
+    """
+    
+    print(f"Sampling {sample_size} articles ({weight}) from the whole dump...")
+    rows = sample_dump(dump_path, sample_size, row_from_page, SAMPLE_WEIGHTS[weight], seed, workers,
+                       index_path)
+    write_rows(rows, config_path, bulk)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Import Wikipedia articles to database')
     parser.add_argument('--source-dir', default='data/extracted_wiki',
                        help='Directory containing extracted Wikipedia JSON files')
     parser.add_argument('--config', default='config.json',
                        help='Path to config file')
+    parser.add_argument('--store',
+                       help='Import from a precompiled article store (see article_store.py extract)')
+    parser.add_argument('--dump',
+                       help='Import straight from a multistream .xml.bz2 dump instead of extracted JSON')
+    parser.add_argument('--index',
+                       help='Multistream index file (defaults to the one next to --dump)')
+    parser.add_argument('--sample', type=int, default=None,
+                       help='Number of random articles to import with --dump (default 1000) or --store (default all)')
+    parser.add_argument('--full', action='store_true',
+                       help='With --dump, import every article instead of a random sample')
+    parser.add_argument('--reservoir', type=int, default=None, metavar='K',
+                       help='With --dump, import K articles sampled from one pass over the whole dump')
+    parser.add_argument('--weight', choices=sorted(SAMPLE_WEIGHTS), default='uniform',
+                       help='Weighting for --reservoir sampling')
+    parser.add_argument('--seed', type=int, default=None,
+                       help='Random seed for reproducible samples')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Worker processes for JSON imports and --full/--reservoir (default: one per core)')
+    parser.add_argument('--manifest', default=None,
+                       help='Checkpoint manifest for resumable JSON imports (default: <source-dir>/.import_manifest.jsonl)')
+    parser.add_argument('--restart', action='store_true',
+                       help='Ignore the checkpoint manifest and import every file again')
+    parser.add_argument('--bulk', action='store_true',
+                       help='Load through COPY into a staging table instead of one INSERT per article')
     
     args = parser.parse_args()
     
+    if args.store:
+        if not os.path.exists(args.store):
+            print(f"Error: Article store '{args.store}' not found")
+            sys.exit(1)
+        import_store(args.store, args.config, args.sample, args.bulk)
+        sys.exit(0)
+    
+    if args.dump and args.reservoir:
+        # Works with or without the index; without it the dump is streamed linearly
+        if not os.path.exists(args.dump):
+            print(f"Error: Dump '{args.dump}' not found")
+            sys.exit(1)
+        index_path = args.index or default_index_path(args.dump)
+        import_dump_reservoir(args.dump, args.reservoir, args.config,
+                              index_path if os.path.exists(index_path) else None,
+                              args.weight, args.seed, args.workers, args.bulk)
+        sys.exit(0)
+    
+    if args.dump:
+        index_path = args.index or default_index_path(args.dump)
+        if not os.path.exists(args.dump) or not os.path.exists(index_path):
+            print(f"Error: need both '{args.dump}' and '{index_path}'")
+            sys.exit(1)
+        if args.full:
+            import_dump_full(args.dump, args.config, index_path, args.workers, args.bulk)
+        else:
+            import_dump_sample(args.dump, args.sample or 1000, args.config, index_path, args.bulk)
+        sys.exit(0)
+    
     if not os.path.exists(args.source_dir):
         print(f"Error: Directory '{args.source_dir}' not found")
         print("Make sure you've extracted the Wikipedia dump first.")
         sys.exit(1)
     
-    import_articles(args.source_dir, args.config)
+    import_articles(args.source_dir, args.config, args.bulk, args.workers, args.manifest, args.restart)
 
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the DeepSeek / OpenAI chat completions API.
+
+Serves `POST /v1/chat/completions` with canned but well-formed replies:
+post JSON for post prompts, `{"comments": [...]}` for batched persona
+prompts and plain text for single comments. Latency and error rates are
+configurable, so the generator pipeline can be measured and load-tested
+without network access or API spend. `GET /stats` reports request counts.
+
+Usage:
+    python3 scripts/mock_llm_server.py --port 8001 --latency 0.4 --distribution lognormal --error-rate 0.02
+    LLM_BASE_URL=http://127.0.0.1:8001/v1 python3 content_generator.py
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORIES = ['History', 'Science', 'Technology', 'Nature', 'Culture', 'Geography', 'Space']
+
+_PERSONA_LINE = re.compile(r'^- ([^:\n]+):', re.MULTILINE)
+_ARTICLE_TITLE = re.compile(r'^Wikipedia Article: (.+)$', re.MULTILINE)
+
+
+class MockConfig:
+    """Latency and failure behaviour of the mock server."""
+
+    def __init__(self, latency=0.3, distribution='fixed', error_rate=0.0,
+                 error_statuses=(429, 500), retry_after=1.0, seed=None):
+        self.latency = latency
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'posts': 0, 'comment_batches': 0, 'comments': 0}
+
+    def delay(self):
+        """Draw one response latency in seconds, with `latency` as the mean."""
+        with self.lock:
+            if self.distribution == 'uniform':
+                return self.rng.uniform(0, 2 * self.latency)
+            if self.distribution == 'exponential':
+                return self.rng.expovariate(1 / self.latency) if self.latency else 0.0
+            if self.distribution == 'lognormal':
+                # sigma 0.5 gives a realistic long tail; mu keeps the mean at `latency`
+                sigma = 0.5
+                return self.rng.lognormvariate(0, sigma) * self.latency / 1.1331
+            return self.latency
+
+    def error(self):
+        """HTTP status to fail this request with, or None."""
+        with self.lock:
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return self.rng.choice(self.error_statuses)
+        return None
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+
+def post_payload(prompt, rng):
+    """Post JSON the way the generator's post prompt asks for it."""
+    match = _ARTICLE_TITLE.search(prompt)
+    title = match.group(1).strip() if match else 'Something'
+    return json.dumps({
+        'title': f"You won't believe what {title} has been hiding all along",
+        'content': (f"{title} is stranger than it looks. " * 6).strip(),
+        'category': rng.choice(CATEGORIES),
+        'tags': [title.split()[0].lower(), 'til', 'wikipedia'],
+        'images': [],
+        'quality_score': round(rng.uniform(6.5, 9.5), 1),
+        'tldr': f"{title} in one surprising sentence."
+    })
+
+
+def reply_for(body, config):
+    """Pick the canned reply for a chat completions request body."""
+    messages = body.get('messages', [])
+    prompt = messages[-1].get('content', '') if messages else ''
+
+    if (body.get('response_format') or {}).get('type') == 'json_object' and 'Commenters:' in prompt:
+        personas = _PERSONA_LINE.findall(prompt)
+        config.count('comment_batches')
+        config.count('comments', len(personas))
+        return json.dumps({'comments': [
+            {'persona': name.strip(), 'comment': f"As {name.strip()}, I had no idea about this. Wild stuff."}
+            for name in personas
+        ]})
+    if 'Wikipedia Article:' in prompt:
+        config.count('posts')
+        with config.lock:
+            return post_payload(prompt, config.rng)
+    config.count('comments')
+    return "This is fascinating, I had no idea. Does anyone have a source for the second part?"
+
+
+def completion(body, content):
+    prompt_chars = sum(len(str(m.get('content', ''))) for m in body.get('messages', []))
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = len(content) // 4
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'mock'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop'
+        }],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+    }
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, payload, headers=None):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                with config.lock:
+                    self._send(200, dict(config.stats))
+            else:
+                self._send(404, {'error': {'message': 'not found'}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send(404, {'error': {'message': 'not found'}})
+                return
+
+            config.count('requests')
+            time.sleep(config.delay())
+
+            status = config.error()
+            if status:
+                config.count('errors')
+                headers = {'Retry-After': str(config.retry_after)} if status == 429 else None
+                self._send(status, {'error': {'message': f'mock error {status}', 'type': 'mock'}}, headers)
+                return
+
+            self._send(200, completion(body, reply_for(body, config)))
+
+        def log_message(self, format, *args):
+            pass  # keep benchmark output readable
+
+    return Handler
+
+
+def start_server(config, host='127.0.0.1', port=0):
+    """Start the mock server on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='mock-llm', daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def add_arguments(parser):
+    """Mock behaviour flags, shared with the benchmark harness."""
+    parser.add_argument('--latency', type=float, default=0.3, help='Mean response latency in seconds')
+    parser.add_argument('--distribution', choices=['fixed', 'uniform', 'exponential', 'lognormal'],
+                        default='lognormal', help='Latency distribution')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--error-statuses', default='429,500', help='Statuses failed requests return')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After sent with 429s')
+    parser.add_argument('--mock-seed', type=int, default=None, help='Seed for latencies and errors')
+
+
+def config_from_args(args):
+    return MockConfig(args.latency, args.distribution, args.error_rate,
+                      [int(s) for s in args.error_statuses.split(',') if s], args.retry_after,
+                      args.mock_seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock OpenAI-compatible chat completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(config_from_args(args), args.host, args.port)
+    print(f"🧪 Mock LLM server on {base_url}")
+    print(f"   LLM_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
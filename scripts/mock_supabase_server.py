@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Supabase REST API (PostgREST).
+
+Keeps tables in memory and serves the subset of PostgREST the seeding
+scripts use through supabase-py:
+
+    POST   /rest/v1/<table>            insert one row or an array of rows
+    GET    /rest/v1/<table>?select=..  read rows, with eq/neq/in filters
+    DELETE /rest/v1/<table>?<filters>  delete rows
+
+Rows get an `id` (UUID) and `created_at` unless they bring their own; an
+insert that reuses an existing id fails as a whole, like the primary key
+would. A configurable fraction of requests fail (optionally after the
+insert has been applied, like a timeout on a committed request), so the
+scripts' retry handling can be exercised. `GET /stats` reports request
+counts and table sizes.
+
+Usage:
+    python3 scripts/mock_supabase_server.py --port 8002 --error-rate 0.05
+    NEXT_PUBLIC_SUPABASE_URL=http://127.0.0.1:8002 python3 scripts/generate_initial_content.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class MockDatabase:
+    """In-memory tables plus the failure behaviour of the mock server."""
+
+    def __init__(self, error_rate=0.0, lost_reply_rate=0.0, latency=0.0, seed=None):
+        self.error_rate = error_rate
+        self.lost_reply_rate = lost_reply_rate
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.stats = {'requests': 0, 'errors': 0, 'rows_inserted': 0}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def roll(self, rate):
+        with self.lock:
+            return bool(rate) and self.rng.random() < rate
+
+    def insert(self, table, rows):
+        """Insert all rows or none; returns the stored rows or raises KeyError on a duplicate id."""
+        now = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            stored = self.tables.setdefault(table, {})
+            new = [dict(row, id=row.get('id') or str(uuid.uuid4()),
+                        created_at=row.get('created_at') or now) for row in rows]
+            ids = [row['id'] for row in new]
+            if len(set(ids)) != len(ids) or any(row_id in stored for row_id in ids):
+                raise KeyError('duplicate key value violates unique constraint "%s_pkey"' % table)
+            for row in new:
+                stored[row['id']] = row
+            self.stats['rows_inserted'] += len(new)
+            return new
+
+    def select(self, table, filters):
+        with self.lock:
+            return [dict(row) for row in self.tables.get(table, {}).values() if matches(row, filters)]
+
+    def delete(self, table, filters):
+        with self.lock:
+            stored = self.tables.get(table, {})
+            doomed = [row_id for row_id, row in stored.items() if matches(row, filters)]
+            return [stored.pop(row_id) for row_id in doomed]
+
+
+def parse_in(value):
+    """PostgREST `(a,"b,c",d)` list -> ['a', 'b,c', 'd']; backslash escapes inside quotes."""
+    items, current, quoted, escaped = [], '', False, False
+    for char in value.strip()[1:-1]:
+        if escaped:
+            current += char
+            escaped = False
+        elif char == '\\' and quoted:
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            items.append(current)
+            current = ''
+        else:
+            current += char
+    return items + [current] if current or items else items
+
+
+def parse_filters(query):
+    """Query string -> [(column, operator, value)], skipping select/columns/order/limit."""
+    filters = []
+    for column, spec in query:
+        if column in ('select', 'columns', 'order', 'limit', 'offset'):
+            continue
+        operator, _, value = spec.partition('.')
+        filters.append((column, operator, parse_in(value) if operator == 'in' else value))
+    return filters
+
+
+def matches(row, filters):
+    for column, operator, value in filters:
+        cell = row.get(column)
+        cell = '' if cell is None else str(cell)
+        if operator == 'eq' and cell != value:
+            return False
+        if operator == 'neq' and cell == value:
+            return False
+        if operator == 'in' and cell not in value:
+            return False
+    return True
+
+
+def project(rows, select):
+    if not select or select == '*':
+        return rows
+    columns = [column.strip() for column in select.split(',')]
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+def make_handler(db):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, payload=None):
+            data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            # Read it even when unused (supabase-py sends `{}` with GETs and DELETEs)
+            length = int(self.headers.get('Content-Length', 0))
+            return json.loads(self.rfile.read(length) or b'null')
+
+        def _route(self):
+            """(table, query) for /rest/v1/<table>, or None after answering 404."""
+            url = urlsplit(self.path)
+            prefix = '/rest/v1/'
+            if not url.path.startswith(prefix) or '/' in url.path[len(prefix):].strip('/'):
+                self._send(404, {'message': 'not found'})
+                return None
+            return url.path[len(prefix):].strip('/'), parse_qsl(url.query, keep_blank_values=True)
+
+        def _fail(self):
+            if db.roll(db.error_rate):
+                db.count('errors')
+                self._send(503, {'message': 'mock error 503', 'code': 'mock'})
+                return True
+            return False
+
+        def _returning(self, rows, query, created=False):
+            status = 201 if created else 200
+            if 'return=representation' in self.headers.get('Prefer', ''):
+                self._send(status, project(rows, dict(query).get('select')))
+            else:
+                self._send(201 if created else 204)
+
+        def do_GET(self):
+            self._body()
+            if urlsplit(self.path).path.rstrip('/') == '/stats':
+                with db.lock:
+                    stats = dict(db.stats, tables={name: len(rows) for name, rows in db.tables.items()})
+                self._send(200, stats)
+                return
+            route = self._route()
+            if route is None:
+                return
+            db.count('requests')
+            time.sleep(db.latency)
+            if self._fail():
+                return
+            table, query = route
+            self._send(200, project(db.select(table, parse_filters(query)), dict(query).get('select')))
+
+        def do_POST(self):
+            body = self._body()
+            route = self._route()
+            if route is None:
+                return
+            db.count('requests')
+            time.sleep(db.latency)
+            if self._fail():
+                return
+            table, query = route
+            try:
+                rows = db.insert(table, body if isinstance(body, list) else [body])
+            except KeyError as e:
+                self._send(409, {'message': e.args[0], 'code': '23505'})
+                return
+            if db.roll(db.lost_reply_rate):
+                # Committed, but the client never hears back
+                db.count('errors')
+                self._send(504, {'message': 'mock gateway timeout', 'code': 'mock'})
+                return
+            self._returning(rows, query, created=True)
+
+        def do_DELETE(self):
+            self._body()
+            route = self._route()
+            if route is None:
+                return
+            db.count('requests')
+            table, query = route
+            self._returning(db.delete(table, parse_filters(query)), query)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(db, host='127.0.0.1', port=0):
+    """Start the mock server on a background thread; returns (server, url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(db))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='mock-supabase', daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock Supabase REST (PostgREST) server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8002)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests that fail before doing anything')
+    parser.add_argument('--lost-reply-rate', type=float, default=0.0,
+                        help='Fraction of inserts that are applied but answered with an error')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for injected failures')
+    args = parser.parse_args()
+
+    db = MockDatabase(args.error_rate, args.lost_reply_rate, args.latency, args.seed)
+    server, url = start_server(db, args.host, args.port)
+    print(f"🧪 Mock Supabase server on {url}")
+    print(f"   NEXT_PUBLIC_SUPABASE_URL={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
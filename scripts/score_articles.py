@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Offline interestingness scoring for wiki_articles.
+
+Scores are computed locally (no LLM) from cheap text features - length,
+link density, images, categories, infobox, and how often the article uses
+superlatives and numbers - combined in NumPy batches into a 0-10
+quality_score. import_wiki_to_db.py scores rows as it imports them; run
+this script to (re)score articles that are already in the database.
+
+Usage:
+    python3 scripts/score_articles.py            # score unscored articles
+    python3 scripts/score_articles.py --all      # rescore everything
+"""
+
+import argparse
+import re
+import time
+
+import numpy as np
+
+from wikitext import extract_features
+
+# Words that tend to mark a TIL-worthy fact
+_SUPERLATIVES = re.compile(
+    r'\b(?:first|only|largest|oldest|smallest|longest|tallest|deepest|fastest|highest|'
+    r'biggest|rarest|most|least|record|unique|unusual|mysterious|unknown|secret|'
+    r'discovered|famous|strangest|earliest|last)\b',
+    re.IGNORECASE
+)
+_NUMBER = re.compile(r'\d[\d,.]*')
+
+FEATURES = ('length', 'links', 'images', 'categories', 'infobox', 'superlatives', 'numbers')
+
+# Feature values are log-scaled and centred on a typical mid-sized article
+# (5k chars, 8 links/kchar, 2 images, 5 categories, 3 superlatives and
+# 5 numbers per 1k words) so the weights below are comparable.
+_CENTRES = np.log1p(np.array([5000.0, 8.0, 2.0, 5.0, 0.0, 3.0, 5.0]))
+_CENTRES[FEATURES.index('infobox')] = 0.5
+_WEIGHTS = np.array([1.2, 0.4, 0.6, 0.3, 0.8, 0.8, 0.3])
+_BIAS = 0.2
+
+
+def article_features(text, features=None):
+    """
+    Raw feature vector for one article (counts, not yet scaled).
+
+    Links, images, categories and the infobox come from
+    wikitext.extract_features, so pass its result in when you already have it.
+    """
+    if features is None:
+        features = extract_features(text, lead=False)
+    chars = max(len(text), 1)
+    words = max(text.count(' ') + 1, 1)
+    return (
+        chars,
+        features['link_count'] * 1000.0 / chars,
+        len(features['images']),
+        len(features['categories']),
+        0.0 if features['infobox'] is None else 1.0,
+        len(_SUPERLATIVES.findall(text)) * 1000.0 / words,
+        len(_NUMBER.findall(text)) * 1000.0 / words,
+    )
+
+
+def score_features(matrix):
+    """Vectorized 0-10 score for an (n, len(FEATURES)) array of raw features."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if matrix.size == 0:
+        return np.zeros(0)
+    scaled = np.log1p(matrix)
+    infobox = FEATURES.index('infobox')
+    scaled[:, infobox] = matrix[:, infobox]
+    z = (scaled - _CENTRES) @ _WEIGHTS + _BIAS
+    return np.round(10.0 / (1.0 + np.exp(-z)), 2)
+
+
+def score_rows(rows, batch_size=1000):
+    """
+    Score prepared articles a batch at a time, yielding wiki_articles rows.
+
+    Takes the `(row, features)` pairs built by import_wiki_to_db.prepare_article,
+    where row is `(page_id, title, content, url, categories, images)` and
+    features its article_features vector; quality_score is appended to the row.
+    """
+    batch = []
+    for prepared in rows:
+        batch.append(prepared)
+        if len(batch) >= batch_size:
+            yield from _score_batch(batch)
+            batch = []
+    if batch:
+        yield from _score_batch(batch)
+
+
+def _score_batch(batch):
+    scores = score_features([features for _, features in batch])
+    for (row, _), score in zip(batch, scores):
+        yield row + (float(score),)
+
+
+def rescore(conn, rescore_all=False, batch_size=5000):
+    """Score articles already in wiki_articles and write the scores back in bulk."""
+    from psycopg2.extras import execute_values
+
+    # Server-side cursor that survives the per-batch commits below
+    read_cursor = conn.cursor(name='score_articles', withhold=True)
+    where = '' if rescore_all else 'WHERE quality_score IS NULL OR quality_score = 0'
+    read_cursor.execute(f"SELECT id, content FROM wiki_articles {where}")
+
+    write_cursor = conn.cursor()
+    scored = 0
+    started = time.time()
+
+    while True:
+        batch = read_cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        scores = score_features([article_features(content or '') for _, content in batch])
+        execute_values(write_cursor, """
+            UPDATE wiki_articles AS w SET quality_score = v.score
+            FROM (VALUES %s) AS v(id, score)
+            WHERE w.id = v.id
+        """, [(row[0], float(score)) for row, score in zip(batch, scores)], page_size=batch_size)
+        conn.commit()
+        scored += len(batch)
+        print(f"   {scored} scored ({scored / max(time.time() - started, 1e-9):.0f}/sec)")
+
+    read_cursor.close()
+    write_cursor.close()
+    conn.commit()
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score wiki_articles without calling the LLM')
+    parser.add_argument('--config', default='config.json', help='Path to config file')
+    parser.add_argument('--all', action='store_true', help='Rescore articles that already have a score')
+    args = parser.parse_args()
+
+    from import_wiki_to_db import connect
+
+    conn = connect(args.config)
+    scored = rescore(conn, args.all)
+    conn.close()
+    print(f"\n✅ Scored {scored} articles")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Random-access reader for Wikipedia multistream dumps.
+
+A `*-pages-articles-multistream.xml.bz2` dump is a concatenation of
+independent bz2 streams of ~100 pages each. The companion
+`*-multistream-index.txt.bz2` lists `offset:page_id:title` for every page,
+so we can seek straight to any stream and decompress only that block
+instead of scanning the 24GB file from byte 0.
+"""
+
+import bz2
+import heapq
+import io
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import xml.etree.ElementTree as ET
+from array import array
+from collections import namedtuple
+
+# One parsed <page> from the dump
+Page = namedtuple('Page', ['id', 'ns', 'title', 'text'])
+
+# Main (article) namespace
+ARTICLE_NAMESPACES = (0,)
+
+READ_SIZE = 256 * 1024
+
+
+def default_index_path(dump_path):
+    """Guess the index file that ships next to a multistream dump."""
+    return dump_path.replace('multistream.xml.bz2', 'multistream-index.txt.bz2')
+
+
+class MultistreamIndex:
+    """Compact table of bz2 stream offsets loaded from the multistream index."""
+
+    def __init__(self, index_path, cache=True):
+        self.index_path = index_path
+        self.offsets = array('q')
+        self.page_counts = array('l')
+
+        cache_path = index_path + '.offsets'
+        if cache and self._load_cache(cache_path):
+            return
+
+        self._load_index()
+        if cache:
+            self._save_cache(cache_path)
+
+    def _load_index(self):
+        """Read every `offset:page_id:title` line, keeping one entry per stream."""
+        last_offset = -1
+        with bz2.open(self.index_path, 'rb') as f:
+            for line in f:
+                offset = int(line.split(b':', 1)[0])
+                if offset != last_offset:
+                    self.offsets.append(offset)
+                    self.page_counts.append(0)
+                    last_offset = offset
+                self.page_counts[-1] += 1
+
+    def _load_cache(self, cache_path):
+        """Load a previously saved offset table if it is newer than the index."""
+        try:
+            if os.path.getmtime(cache_path) < os.path.getmtime(self.index_path):
+                return False
+            with open(cache_path, 'rb') as f:
+                count = array('q')
+                count.fromfile(f, 1)
+                self.offsets.fromfile(f, count[0])
+                self.page_counts.fromfile(f, count[0])
+            return True
+        except (OSError, EOFError):
+            self.offsets = array('q')
+            self.page_counts = array('l')
+            return False
+
+    def _save_cache(self, cache_path):
+        """Persist the offset table so later runs skip re-reading the index."""
+        try:
+            with open(cache_path, 'wb') as f:
+                array('q', [len(self.offsets)]).tofile(f)
+                self.offsets.tofile(f)
+                self.page_counts.tofile(f)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def total_pages(self):
+        return sum(self.page_counts)
+
+    def random_offsets(self, count, rng=None):
+        """Pick `count` distinct stream offsets uniformly at random."""
+        rng = rng or random
+        count = min(count, len(self.offsets))
+        return [self.offsets[i] for i in rng.sample(range(len(self.offsets)), count)]
+
+
+def read_stream(f, offset):
+    """Decompress the single bz2 stream that starts at `offset` in open file `f`."""
+    f.seek(offset)
+    decompressor = bz2.BZ2Decompressor()
+    chunks = []
+    while not decompressor.eof:
+        data = f.read(READ_SIZE)
+        if not data:
+            break
+        chunks.append(decompressor.decompress(data))
+    return b''.join(chunks)
+
+
+def _local_name(tag):
+    """Strip the `{http://www.mediawiki.org/xml/export-...}` prefix from a tag."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_pages(source, namespaces=ARTICLE_NAMESPACES, skip_redirects=True):
+    """
+    Lazily yield Page tuples from a binary XML stream.
+
+    Uses incremental parse events instead of building a DOM per page, and
+    clears the tree after every page so memory stays flat no matter how big
+    the dump is. Pass `namespaces=None` to keep pages from every namespace.
+    """
+    root = None
+    page_id = ns = title = text = None
+    redirect = False
+
+    # Start events are only used to grab the root so finished pages can be
+    # detached from it. The page <id> always closes before the revision and
+    # contributor ids, and per-page state is reset once the page closes.
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+        tag = _local_name(elem.tag)
+
+        if tag == 'title':
+            title = elem.text or ''
+        elif tag == 'ns':
+            ns = int(elem.text)
+        elif tag == 'id':
+            if page_id is None:
+                page_id = int(elem.text)
+        elif tag == 'redirect':
+            redirect = True
+        elif tag == 'text':
+            text = elem.text or ''
+        elif tag == 'page':
+            if not (skip_redirects and redirect) and (namespaces is None or ns in namespaces):
+                yield Page(page_id, ns, title, text or '')
+            page_id = ns = title = text = None
+            redirect = False
+            root.clear()
+
+
+def iter_dump_pages(dump_path, namespaces=ARTICLE_NAMESPACES):
+    """Stream every page of a (optionally bz2-compressed) dump from the start."""
+    opener = bz2.open if dump_path.endswith('.bz2') else open
+    with opener(dump_path, 'rb') as f:
+        yield from iter_pages(f, namespaces)
+
+
+def parse_pages(xml_bytes, namespaces=ARTICLE_NAMESPACES):
+    """Parse a block of bare <page> elements from one multistream stream."""
+    return iter_pages(io.BytesIO(b'<pages>' + xml_bytes + b'</pages>'), namespaces)
+
+
+class MultistreamDump:
+    """Seekable view over a multistream dump and its index."""
+
+    def __init__(self, dump_path, index_path=None):
+        self.dump_path = dump_path
+        self.index = MultistreamIndex(index_path or default_index_path(dump_path))
+
+    def read_block(self, offset, f=None):
+        """Decompress the single bz2 stream that starts at `offset`."""
+        if f is not None:
+            return read_stream(f, offset)
+        with open(self.dump_path, 'rb') as f:
+            return read_stream(f, offset)
+
+    def iter_block(self, offset, f=None):
+        """Yield the pages stored in the stream at `offset`."""
+        return parse_pages(self.read_block(offset, f))
+
+    def sample_pages(self, count, predicate=None, rng=None, per_block=1):
+        """
+        Sample roughly `count` pages from random streams across the whole dump.
+
+        Only the chosen blocks are decompressed, so the cost is O(count blocks)
+        regardless of where in the dump the pages live. `per_block` caps how
+        many qualifying pages are taken from one stream to keep the sample spread out.
+        """
+        rng = rng or random
+        pages = []
+        seen_offsets = set()
+
+        with open(self.dump_path, 'rb') as f:
+            while len(pages) < count and len(seen_offsets) < len(self.index):
+                wanted = count - len(pages)
+                offsets = [o for o in self.index.random_offsets(wanted * 2, rng)
+                           if o not in seen_offsets][:wanted]
+                if not offsets:
+                    break
+
+                for offset in offsets:
+                    seen_offsets.add(offset)
+                    candidates = [p for p in self.iter_block(offset, f)
+                                  if predicate is None or predicate(p)]
+                    rng.shuffle(candidates)
+                    pages.extend(candidates[:per_block])
+                    if len(pages) >= count:
+                        break
+
+        return pages[:count]
+
+
+def length_weight(page):
+    """Weight pages by the size of their wikitext."""
+    return len(page.text)
+
+
+def heuristic_weight(page):
+    """Favour long, well-linked, illustrated articles over stubs."""
+    text = page.text
+    images = text.count('[[File:') + text.count('[[Image:')
+    return math.sqrt(len(text)) * (1 + images) * (1 + math.log1p(text.count('[[')))
+
+
+# Weighting schemes selectable from the command line
+SAMPLE_WEIGHTS = {
+    'uniform': None,
+    'length': length_weight,
+    'heuristic': heuristic_weight,
+}
+
+
+class Reservoir:
+    """
+    Bounded weighted reservoir (Efraimidis-Spirakis A-Res) holding `k` items.
+
+    Every offered item gets the key log(u) / weight and the `k` largest keys
+    win, which gives a uniform sample when all weights are equal. Keys from
+    separate reservoirs are comparable, so partial reservoirs built in
+    worker processes can be merged into one sample of the whole stream.
+    """
+
+    def __init__(self, k, rng=None):
+        self.k = k
+        self.rng = rng or random
+        self._heap = []
+        self._counter = itertools.count()
+
+    def offer(self, record, weight=1.0):
+        if weight <= 0 or self.k <= 0:
+            return
+        key = math.log(1.0 - self.rng.random()) / weight
+        self.push(key, record)
+
+    def push(self, key, record):
+        entry = (key, next(self._counter), record)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def keyed(self):
+        return [(key, record) for key, _, record in self._heap]
+
+    def items(self):
+        return [record for _, _, record in sorted(self._heap, reverse=True)]
+
+
+# Per-process state for the parallel decoder (set by _init_worker)
+_worker_file = None
+_worker_transform = None
+_worker_weight = None
+
+
+def _init_worker(dump_path, transform, weight=None):
+    global _worker_file, _worker_transform, _worker_weight
+    _worker_file = open(dump_path, 'rb')
+    _worker_transform = transform
+    _worker_weight = weight
+
+
+def _decode_streams(offsets):
+    """Decompress and parse a run of streams inside a pool worker."""
+    results = []
+    for offset in offsets:
+        for page in parse_pages(read_stream(_worker_file, offset)):
+            record = _worker_transform(page) if _worker_transform else page
+            if record is not None:
+                results.append(record)
+    return results
+
+
+def iter_pages_parallel(dump, transform=None, workers=None, streams_per_task=8):
+    """
+    Decompress and parse every stream of the dump across a process pool.
+
+    `transform(page)` runs inside the workers and should return the record to
+    keep, or None to drop the page; it must be a module-level function so it
+    can be pickled. Records are yielded in dump order regardless of which
+    worker finished first, so runs are deterministic.
+    """
+    workers = workers or os.cpu_count() or 1
+    offsets = dump.index.offsets
+    tasks = (offsets[i:i + streams_per_task]
+             for i in range(0, len(offsets), streams_per_task))
+
+    with multiprocessing.Pool(workers, _init_worker, (dump.dump_path, transform)) as pool:
+        for records in pool.imap(_decode_streams, tasks):
+            yield from records
+
+
+def _sample_streams(args):
+    """
+    Build a partial reservoir over a run of streams inside a pool worker.
+
+    Only positions, `(stream offset, page number in the stream)`, are kept,
+    so a task sends back k keys and positions instead of k full records.
+    """
+    task_index, offsets, k, seed = args
+    rng = random.Random(f'{seed}:{task_index}') if seed is not None else random.Random()
+    reservoir = Reservoir(k, rng)
+    for offset in offsets:
+        for slot, page in enumerate(parse_pages(read_stream(_worker_file, offset))):
+            if _worker_transform is None or _worker_transform(page) is not None:
+                reservoir.offer((offset, slot), _worker_weight(page) if _worker_weight else 1.0)
+    return reservoir.keyed()
+
+
+def _fetch_records(args):
+    """Re-read one stream inside a pool worker and return the records at `slots`."""
+    offset, slots = args
+    records = {}
+    for slot, page in enumerate(parse_pages(read_stream(_worker_file, offset))):
+        if slot in slots:
+            records[(offset, slot)] = _worker_transform(page) if _worker_transform else page
+    return records
+
+
+def sample_dump(dump_path, k, transform=None, weight=None, seed=None, workers=None,
+                index_path=None, streams_per_task=64):
+    """
+    Sample `k` records from the whole dump in one pass and O(k) memory.
+
+    With a multistream index the pass is split across a process pool and the
+    per-worker reservoirs of page positions are merged; only the streams
+    holding the k winners are then read again to build their records, so
+    the pool's result pipe carries k records rather than k per task.
+    Otherwise the dump is streamed linearly. `weight(page)` makes the sample
+    proportional to the returned weight instead of uniform. The same `seed`
+    always gives the same sample.
+    """
+    reservoir = Reservoir(k, random.Random(seed))
+    dump = MultistreamDump(dump_path, index_path) if index_path else open_dump(dump_path)
+
+    if dump is None:
+        for page in iter_dump_pages(dump_path):
+            record = transform(page) if transform else page
+            if record is not None:
+                reservoir.offer(record, weight(page) if weight else 1.0)
+        return reservoir.items()
+
+    offsets = dump.index.offsets
+    tasks = ((i, offsets[start:start + streams_per_task], k, seed)
+             for i, start in enumerate(range(0, len(offsets), streams_per_task)))
+    workers = workers or os.cpu_count() or 1
+
+    with multiprocessing.Pool(workers, _init_worker, (dump.dump_path, transform, weight)) as pool:
+        for keyed in pool.imap(_sample_streams, tasks):
+            for key, position in keyed:
+                reservoir.push(key, position)
+
+        positions = reservoir.items()
+        slots = {}
+        for offset, slot in positions:
+            slots.setdefault(offset, set()).add(slot)
+        records = {}
+        for fetched in pool.imap_unordered(_fetch_records, sorted(slots.items()), chunksize=16):
+            records.update(fetched)
+
+    return [records[position] for position in positions]
+
+
+def open_dump(dump_path):
+    """Return a MultistreamDump if the index is available, otherwise None."""
+    index_path = default_index_path(dump_path)
+    if index_path == dump_path or not os.path.exists(index_path):
+        return None
+    return MultistreamDump(dump_path, index_path)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Wikitext feature extraction in one call.
+
+`extract_features` returns an article's images (`[[File:...]]`,
+`[[Image:...]]` and `<gallery>` entries), category links, infobox type,
+wikilink count and plain-text lead section together (the lead only when
+asked for: cleaning it up is the expensive part). Each feature uses a
+precompiled pattern with a literal prefix so the regex engine can skip
+ahead in C; on CPython that is faster than one alternation pattern walked
+match by match from Python.
+"""
+
+import re
+
+_MEDIA = re.compile(r'\[\[\s*(File|Image|Category)\s*:\s*([^|\]\n]+)', re.IGNORECASE)
+_GALLERY = re.compile(r'<gallery[^>]*>(.*?)</gallery>', re.IGNORECASE | re.DOTALL)
+_INFOBOX = re.compile(r'\{\{\s*Infobox[ _]+([^|\n}<]+)', re.IGNORECASE)
+_GALLERY_PREFIX = re.compile(r'^\s*(?:File|Image)\s*:\s*', re.IGNORECASE)
+
+# Lead cleanup
+_NOISE = re.compile(r'<!--.*?-->|<ref[^>/]*/>|<ref[^>]*>.*?</ref>', re.DOTALL | re.IGNORECASE)
+_BRACES = re.compile(r'\{\{|\}\}|\{\||\|\}')
+_MEDIA_LINK = re.compile(r'\[\[\s*(?:File|Image|Category)\s*:(?:[^\[\]]|\[\[[^\]]*\]\])*\]\]',
+                         re.IGNORECASE)
+_PIPED_LINK = re.compile(r'\[\[[^\[\]|]*\|([^\[\]]*)\]\]')
+_LINK = re.compile(r'\[\[([^\[\]]*)\]\]')
+_EXTERNAL_LINK = re.compile(r'\[https?://[^\s\]]+\s*([^\]]*)\]')
+_TAG = re.compile(r'<[^>]+>')
+_SPACES = re.compile(r'  +')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def _strip_nested(text):
+    """Drop {{templates}} and {| tables |}, however deeply nested, in one scan."""
+    parts = []
+    depth = 0
+    pos = 0
+    for match in _BRACES.finditer(text):
+        if depth == 0:
+            parts.append(text[pos:match.start()])
+        if match.group() in ('{{', '{|'):
+            depth += 1
+        elif depth:
+            depth -= 1
+        pos = match.end()
+    if depth == 0:
+        parts.append(text[pos:])
+    return ''.join(parts)
+
+
+def plain_text(wikitext):
+    """Strip templates, references, tables and link markup from a wikitext fragment."""
+    text = _NOISE.sub('', wikitext)
+    text = _strip_nested(text)
+    text = _MEDIA_LINK.sub('', text)
+    text = _PIPED_LINK.sub(r'\1', text)
+    text = _LINK.sub(r'\1', text)
+    text = _EXTERNAL_LINK.sub(r'\1', text)
+    text = _TAG.sub('', text)
+    text = text.replace("'''", '').replace("''", '').replace('\t', ' ')
+    text = _SPACES.sub(' ', text)
+    text = _BLANK_LINES.sub('\n\n', text)
+    return '\n'.join(line.strip() for line in text.strip().split('\n'))
+
+
+def extract_features(text, lead=True):
+    """
+    Return the images, categories, infobox type, plain-text lead section
+    and wikilink count of an article's wikitext.
+
+    Cleaning up the lead costs about 4x the rest; with lead=False it is
+    skipped and 'lead' is None.
+    """
+    images = []
+    categories = []
+    media = _MEDIA.findall(text)
+
+    for namespace, target in media:
+        target = target.strip()
+        if namespace.lower() == 'category':
+            categories.append(target)
+        elif not target.startswith('http'):
+            images.append(target)
+
+    for gallery in _GALLERY.findall(text):
+        for line in gallery.split('\n'):
+            filename = _GALLERY_PREFIX.sub('', line.split('|', 1)[0]).strip()
+            if filename:
+                images.append(filename)
+
+    infobox = _INFOBOX.search(text)
+    if lead:
+        # The lead runs up to the first section heading
+        if text.startswith('=='):
+            lead = ''
+        else:
+            heading = text.find('\n==')
+            lead = text[:heading] if heading >= 0 else text
+        lead = plain_text(lead)
+    else:
+        lead = None
+
+    return {
+        'images': list(dict.fromkeys(images)),
+        'categories': list(dict.fromkeys(categories)),
+        'infobox': infobox.group(1).strip().lower() if infobox else None,
+        'lead': lead,
+        # Every [[ opens a link; file, image and category links aren't prose links
+        'link_count': text.count('[[') - len(media),
+    }
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Buffered bulk writer for the Supabase seeding scripts.
+
+Inserting one post per request, then one request per comment, makes seeding
+thousands of posts cost thousands of HTTP round trips. The writer instead
+collects posts with their comments and flushes them as PostgREST array
+inserts, `chunk_size` rows per request:
+
+- each post gets its UUID when it is buffered, so its comments can carry
+  the `post_id` before the post chunk has been written, and a chunk's
+  returned ids can be checked against the ones that were sent;
+- full chunks are written on a background thread while the script keeps
+  generating (one chunk at a time, so posts always land before their
+  comments);
+- a failed chunk is retried with backoff. A PostgREST insert is one
+  statement, so a chunk lands whole or not at all; before resending, the
+  writer looks the chunk's ids up in case the "failed" request actually
+  committed, and never writes a row twice;
+- comments of posts whose chunk failed for good are dropped with them.
+
+Usage:
+    with BufferedWriter(supabase) as writer:
+        writer.add_post(post_row, comment_rows)
+    print(writer.posts_written, writer.requests)
+
+Configuration (environment):
+    SUPABASE_WRITE_CHUNK    rows per insert request (default 200)
+    SUPABASE_WRITE_RETRIES  retries per failed chunk (default 4)
+"""
+
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Retry backoff: 1s, 2s, 4s ... capped
+MAX_BACKOFF = 30
+
+
+class BufferedWriter:
+    """Collects posts and comments and writes them as chunked array inserts."""
+
+    def __init__(self, client, chunk_size=None, retries=None):
+        self.client = client
+        self.chunk_size = max(1, int(chunk_size or os.getenv('SUPABASE_WRITE_CHUNK', 200)))
+        self.retries = int(retries if retries is not None else os.getenv('SUPABASE_WRITE_RETRIES', 4))
+        self.posts_written = 0
+        self.comments_written = 0
+        self.posts_failed = 0
+        self.requests = 0
+        self.written = []    # returned rows of the posts that landed
+        self._posts = []     # buffered post rows
+        self._comments = []  # buffered comment rows, post_id already set
+        self._pending = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='supabase-writer')
+
+    def add_post(self, post, comments=()):
+        """Buffer a post row and its comment rows; returns the post's id."""
+        post = dict(post)
+        post.setdefault('id', str(uuid.uuid4()))
+        self._posts.append(post)
+        for comment in comments:
+            self._comments.append(dict(comment, id=comment.get('id') or str(uuid.uuid4()),
+                                       post_id=post['id']))
+        if len(self._posts) >= self.chunk_size:
+            self.flush(wait=False)
+        return post['id']
+
+    def flush(self, wait=True):
+        """Hand everything buffered to the writer thread; by default wait for it."""
+        if self._posts:
+            posts, comments = self._posts, self._comments
+            self._posts, self._comments = [], []
+            # Waiting for the previous chunk keeps at most one write in flight
+            self._wait()
+            self._pending = self._executor.submit(self._write, posts, comments)
+        if wait:
+            self._wait()
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _wait(self):
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def _write(self, posts, comments):
+        landed = set()
+        for start in range(0, len(posts), self.chunk_size):
+            chunk = posts[start:start + self.chunk_size]
+            rows = self._insert('posts', chunk)
+            if rows is None:
+                self.posts_failed += len(chunk)
+                continue
+            self.written.extend(rows)
+            self.posts_written += len(chunk)
+            landed.update(post['id'] for post in chunk)
+
+        comments = [comment for comment in comments if comment['post_id'] in landed]
+        for start in range(0, len(comments), self.chunk_size):
+            chunk = comments[start:start + self.chunk_size]
+            if self._insert('comments', chunk) is not None:
+                self.comments_written += len(chunk)
+
+    def _insert(self, table, rows):
+        """Insert `rows` in one request, retrying; returns the rows written or None."""
+        for attempt in range(self.retries + 1):
+            try:
+                if attempt:
+                    # The failed request may have committed before the error reached us
+                    existing = self._existing(table, [row['id'] for row in rows])
+                    if len(existing) == len(rows):
+                        return existing
+                self.requests += 1
+                result = self.client.table(table).insert(rows).execute()
+                returned = {row['id'] for row in result.data or []}
+                if returned != {row['id'] for row in rows}:
+                    raise RuntimeError(f"{table} insert returned {len(returned)} of {len(rows)} rows")
+                return result.data
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"   ❌ Failed to write {len(rows)} {table}: {e}")
+                    return None
+                delay = min(2 ** attempt, MAX_BACKOFF)
+                print(f"   ⚠️  Writing {len(rows)} {table} failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+
+    def _existing(self, table, ids):
+        self.requests += 1
+        result = self.client.table(table).select('*').in_('id', ids).execute()
+        return result.data or []
@@ -5,10 +5,12 @@ This doesn't require database setup - just tests the AI generation.
 """
 
 import os
-from openai import OpenAI
 import json
 from dotenv import load_dotenv
 
+from llm_backends import make_client
+from llm_json import decode_json, json_mode, parse_stats
+
 # Load environment variables
 load_dotenv()
 
@@ -20,10 +22,7 @@ if not api_key:
     exit(1)
 
 # Initialize DeepSeek client
-client = OpenAI(
-    api_key=api_key,
-    base_url="https://api.deepseek.com/v1"
-)
+client = make_client(api_key)
 
 print(f"✅ Connected to DeepSeek API")
 print(f"   Model: deepseek-v3.2-exp")
@@ -93,24 +92,18 @@ Make it punchy, make it interesting, make people want to read it. Think r/todayi
         print(f"🔄 Generating post from: {article['title']}...")
         
         response = client.chat.completions.create(
-            model="deepseek-chat",
+            task='post',
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=0.8,
-            max_tokens=1500
+            max_tokens=1500,
+            **json_mode()
         )
         
-        response_text = response.choices[0].message.content.strip()
-        
-        # Parse JSON (handle markdown code blocks)
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        post_data = json.loads(response_text)
+        post_data = decode_json(response.choices[0].message.content,
+                                required=('title', 'content', 'category', 'quality_score'))
         
         # Add article info
         post_data['source_title'] = article['title']
@@ -162,6 +155,15 @@ def main():
         json.dump(generated_posts, f, indent=2)
     
     print(f"\n💾 Saved to {output_file}")
+    
+    stats = parse_stats()
+    print(f"🧾 JSON replies: {stats['responses']} ({stats['extracted']} extracted, "
+          f"{stats['repaired']} repaired, {stats['failed']} failed)")
+    
+    if client.cache:
+        stats = client.cache.stats()
+        print(f"🗄️  LLM cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['entries']} entries, {stats['bytes'] / 1024:.0f} KB)")
 
 if __name__ == "__main__":
     main()